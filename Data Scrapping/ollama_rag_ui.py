@@ -2,6 +2,7 @@ import streamlit as st
 import os
 import json
 import requests
+from requests.adapters import HTTPAdapter
 from typing import List, Dict, Any
 from simple_rag_demo import VedicRAGDemo
 
@@ -39,10 +40,22 @@ def load_rag_system():
         return None
     return VedicRAGDemo()
 
+@st.cache_resource
+def get_http_session() -> requests.Session:
+    """Shared keep-alive session so Ollama calls reuse pooled connections"""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=int(os.getenv("OLLAMA_MAX_CONNECTIONS", "16"))
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
 def check_ollama_connection(base_url: str) -> bool:
     """Check if Ollama server is running"""
     try:
-        response = requests.get(f"{base_url}/api/tags", timeout=2)
+        response = get_http_session().get(f"{base_url}/api/tags", timeout=2)
         return response.status_code == 200
     except:
         return False
@@ -50,7 +63,7 @@ def check_ollama_connection(base_url: str) -> bool:
 def get_ollama_models(base_url: str) -> List[str]:
     """Get list of available Ollama models"""
     try:
-        response = requests.get(f"{base_url}/api/tags", timeout=5)
+        response = get_http_session().get(f"{base_url}/api/tags", timeout=5)
         if response.status_code == 200:
             data = response.json()
             return [model['name'] for model in data.get('models', [])]
@@ -61,7 +74,7 @@ def get_ollama_models(base_url: str) -> List[str]:
 def query_ollama(model: str, prompt: str, base_url: str) -> str:
     """Query Ollama model with streaming response"""
     try:
-        response = requests.post(
+        response = get_http_session().post(
             f"{base_url}/api/generate",
             json={
                 "model": model,
@@ -0,0 +1,128 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict
+from metrics import ADMISSION_ACTIVE, ADMISSION_QUEUE_DEPTH, ADMISSION_REJECTED, ADMISSION_WAIT_SECONDS
+
+# Lower value is served first
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted; retry_after is a hint in whole seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Bounds how many requests generate at once. Requests beyond max_concurrent wait in a
+    per-priority FIFO queue (interactive before batch); when that queue already holds
+    max_queue requests, or a request has waited max_wait_seconds, it is rejected so the
+    client can back off instead of timing out against an overloaded Ollama.
+    """
+
+    def __init__(self, max_concurrent: int = 2, max_queue: int = 16, max_wait_seconds: float = 60.0):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait_seconds = max_wait_seconds
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+        # Moving average of how long a slot is held, for the Retry-After estimate
+        self.avg_service_seconds = 10.0
+        self._waiters: Dict[str, Deque[asyncio.Future]] = {priority: deque() for priority in PRIORITIES}
+
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._waiters.values())
+
+    def saturated(self, priority: str) -> bool:
+        """True if a request of this priority would be rejected right now."""
+        return self.active >= self.max_concurrent and len(self._waiters[priority]) >= self.max_queue
+
+    def retry_after(self) -> int:
+        """Rough time until a slot frees up for a new arrival: the queue ahead drains max_concurrent at a time."""
+        waves = (self.queued() + 1) / max(self.max_concurrent, 1)
+        return max(1, math.ceil(waves * self.avg_service_seconds))
+
+    async def acquire(self, priority: str = "interactive") -> None:
+        started = time.perf_counter()
+        if self.active < self.max_concurrent and not self.queued():
+            self._admit(priority, started)
+            return
+        queue = self._waiters[priority]
+        if len(queue) >= self.max_queue:
+            self._reject(priority, "queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        queue.append(waiter)
+        ADMISSION_QUEUE_DEPTH.labels(priority=priority).set(len(queue))
+        try:
+            await asyncio.wait_for(waiter, self.max_wait_seconds)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # release() handed us the slot just as we gave up; pass it on
+                self.release()
+            else:
+                try:
+                    queue.remove(waiter)
+                except ValueError:
+                    pass
+            ADMISSION_QUEUE_DEPTH.labels(priority=priority).set(len(queue))
+            if isinstance(e, asyncio.TimeoutError):
+                self._reject(priority, "timeout")
+            raise
+        # release() transferred its slot to us, so active was never decremented
+        self.active -= 1
+        self._admit(priority, started)
+
+    def release(self) -> None:
+        """Hand the slot to the oldest waiter of the most urgent priority, or free it."""
+        for priority in sorted(self._waiters, key=PRIORITIES.get):
+            queue = self._waiters[priority]
+            while queue:
+                waiter = queue.popleft()
+                ADMISSION_QUEUE_DEPTH.labels(priority=priority).set(len(queue))
+                if not waiter.done():
+                    waiter.set_result(None)
+                    return
+        self.active -= 1
+        ADMISSION_ACTIVE.set(self.active)
+
+    @asynccontextmanager
+    async def slot(self, priority: str = "interactive"):
+        """Hold a slot for the duration of the block; raises AdmissionRejected if none is granted."""
+        await self.acquire(priority)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.avg_service_seconds = 0.8 * self.avg_service_seconds + 0.2 * (time.perf_counter() - started)
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "max_concurrent": self.max_concurrent,
+            "queued": {priority: len(queue) for priority, queue in self._waiters.items()},
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_service_seconds": round(self.avg_service_seconds, 2)
+        }
+
+    def _admit(self, priority: str, started: float) -> None:
+        self.active += 1
+        self.admitted += 1
+        ADMISSION_ACTIVE.set(self.active)
+        ADMISSION_WAIT_SECONDS.labels(priority=priority).observe(time.perf_counter() - started)
+
+    def _reject(self, priority: str, reason: str) -> None:
+        self.rejected += 1
+        ADMISSION_REJECTED.labels(priority=priority, reason=reason).inc()
+        raise AdmissionRejected(reason, self.retry_after())
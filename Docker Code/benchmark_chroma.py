@@ -0,0 +1,107 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+from typing import Dict, Any, List
+import numpy as np
+from http_pool import open_chroma_client, chroma_location
+
+# Configuration (same variables as main.py / ingest.py)
+CHROMA_HOST = os.getenv("CHROMA_HOST", "localhost")
+CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8000"))
+EMBED_DIM = 768 # nomic-embed-text
+BENCH_COLLECTION = "benchmark_scratch"
+
+
+def run_mode(mode: str, path: str, vectors: np.ndarray, queries: np.ndarray,
+             batch_size: int, top_k: int) -> Dict[str, Any]:
+    """Ingest the vectors into a scratch collection, then time single-query searches."""
+    client = open_chroma_client(mode, CHROMA_HOST, CHROMA_PORT, path)
+    try:
+        client.delete_collection(BENCH_COLLECTION)
+    except Exception:
+        pass
+    collection = client.create_collection(BENCH_COLLECTION, metadata={"hnsw:space": "l2"})
+
+    # Ingest: the same add() calls ChromaVectorStore makes during ingest.py, with chunk-sized documents
+    document = "dharma " * 380
+    started = time.perf_counter()
+    for start in range(0, len(vectors), batch_size):
+        end = min(start + batch_size, len(vectors))
+        collection.add(
+            ids=[f"chunk-{i}" for i in range(start, end)],
+            embeddings=vectors[start:end].tolist(),
+            documents=[document] * (end - start),
+            metadatas=[{"work": f"work-{i % 50}", "domain": "shruti"} for i in range(start, end)]
+        )
+    ingest_seconds = time.perf_counter() - started
+
+    # Queries: one request per question, as /query does
+    collection.query(query_embeddings=[queries[0].tolist()], n_results=top_k) # Load the HNSW segment
+    latencies: List[float] = []
+    for query in queries:
+        started = time.perf_counter()
+        collection.query(query_embeddings=[query.tolist()], n_results=top_k,
+                         include=["documents", "metadatas", "distances"])
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    client.delete_collection(BENCH_COLLECTION)
+    latencies_ms = np.asarray(latencies)
+    return {
+        "mode": mode,
+        "location": chroma_location(mode, CHROMA_HOST, CHROMA_PORT, path),
+        "ingest_vectors_per_second": len(vectors) / ingest_seconds,
+        "query_p50_ms": float(np.percentile(latencies_ms, 50)),
+        "query_p95_ms": float(np.percentile(latencies_ms, 95)),
+        "query_mean_ms": float(latencies_ms.mean())
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare Chroma HTTP and embedded (PersistentClient) modes")
+    parser.add_argument("--modes", default="http,embedded", help="Comma-separated: http, embedded")
+    parser.add_argument("--vectors", type=int, default=20000, help="Chunks to ingest")
+    parser.add_argument("--queries", type=int, default=500, help="Queries to time")
+    parser.add_argument("--batch-size", type=int, default=256, help="Chunks per add() call")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--embedded-path", default=None,
+                        help="Directory for the embedded store (default: a temporary directory, removed afterwards)")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Digital Nalanda - Chroma HTTP vs Embedded Benchmark")
+    print("=" * 60)
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.vectors, EMBED_DIM), dtype=np.float32)
+    queries = rng.standard_normal((args.queries, EMBED_DIM), dtype=np.float32)
+
+    results = []
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        # Use a throwaway directory unless told otherwise, so the real store is never touched
+        path = args.embedded_path or tempfile.mkdtemp(prefix="chroma-bench-")
+        print(f"\nBenchmarking {mode} mode ({args.vectors} vectors, {args.queries} queries)...")
+        try:
+            results.append(run_mode(mode, path, vectors, queries, args.batch_size, args.top_k))
+        except Exception as e:
+            print(f"Skipping {mode} mode: {e}")
+        finally:
+            if not args.embedded_path:
+                shutil.rmtree(path, ignore_errors=True)
+
+    if not results:
+        print("No mode could be benchmarked.")
+        sys.exit(1)
+
+    print("\n" + "=" * 60)
+    print(f"{'mode':<10}{'ingest vec/s':>14}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+    for result in results:
+        print(f"{result['mode']:<10}{result['ingest_vectors_per_second']:>14.0f}"
+              f"{result['query_p50_ms']:>10.2f}{result['query_p95_ms']:>10.2f}{result['query_mean_ms']:>10.2f}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+import re
+import sys
+import asyncio
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.embeddings.ollama import OllamaEmbedding
+from ollama import AsyncClient
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation so trivial variants share a key."""
+    return re.sub(r"\s+", " ", question.strip().lower()).rstrip(" ?!.")
+
+
+@dataclass
+class CachedAnswer:
+    answer: str
+    sources: List[Dict[str, Any]]
+    embedding: Optional[np.ndarray]
+    scope: str = ""
+    created_at: float = field(default_factory=time.monotonic)
+    size_bytes: int = 0
+
+
+class SemanticAnswerCache:
+    """
+    LRU + TTL cache of generated answers, looked up by cosine similarity of
+    the question embedding. Entries are bound to an index version and the
+    whole cache is dropped when the collection changes underneath it.
+    A scope (retrieval mode, filters, ...) keeps answers produced under
+    different retrieval settings apart.
+    """
+
+    def __init__(self, threshold: float = 0.95, ttl_seconds: float = 3600.0,
+                 max_entries: int = 1000, max_bytes: int = 64 * 1024 * 1024):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.index_version: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, CachedAnswer]" = OrderedDict()
+        self._total_bytes = 0
+        self._matrix = None
+        self._matrix_keys: List[str] = []
+        self._matrix_scopes = None
+        self._lock = threading.Lock()
+
+    def set_index_version(self, version: str) -> bool:
+        """Record the current index version; returns True if the cache was invalidated."""
+        with self._lock:
+            if version == self.index_version:
+                return False
+            invalidated = self.index_version is not None
+            self.index_version = version
+            if invalidated:
+                self._clear()
+            return invalidated
+
+    def get_exact(self, question: str, scope: str = "", count_miss: bool = True) -> Optional[CachedAnswer]:
+        """
+        Look up a question by its normalized text without needing an embedding. Callers that
+        go on to get_similar pass count_miss=False, so one lookup is one hit or one miss.
+        """
+        with self._lock:
+            self._evict_expired()
+            key = self._key(question, scope)
+            entry = self._entries.get(key)
+            if entry is None:
+                if count_miss:
+                    self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def get_similar(self, embedding: List[float], scope: str = "") -> Optional[CachedAnswer]:
+        """Return the most similar cached answer in the same scope above the threshold, if any."""
+        with self._lock:
+            self._evict_expired()
+            if self._matrix is None:
+                self._matrix_keys = [k for k, e in self._entries.items() if e.embedding is not None]
+                if self._matrix_keys:
+                    self._matrix = np.vstack([self._entries[k].embedding for k in self._matrix_keys])
+                    self._matrix_scopes = np.asarray([self._entries[k].scope for k in self._matrix_keys], dtype=object)
+            if not self._matrix_keys:
+                self.misses += 1
+                return None
+            scores = np.where(self._matrix_scopes == scope, self._matrix @ self._unit(embedding), -1.0)
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            key = self._matrix_keys[best]
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+    def record_miss(self) -> None:
+        """Count a miss for a get_exact(count_miss=False) lookup that never reached get_similar."""
+        with self._lock:
+            self.misses += 1
+
+    def put(self, question: str, embedding: Optional[List[float]], answer: str,
+            sources: List[Dict[str, Any]], scope: str = "") -> None:
+        """Store an answer; without an embedding it can only be found again by get_exact."""
+        with self._lock:
+            key = self._key(question, scope)
+            vector = self._unit(embedding) if embedding is not None else None
+            size = (vector.nbytes if vector is not None else 0) + sys.getsizeof(answer) + sum(
+                sys.getsizeof(s.get("text", "")) + 256 for s in sources
+            )
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = CachedAnswer(answer=answer, sources=sources, embedding=vector, scope=scope, size_bytes=size)
+            self._total_bytes += size
+            self._matrix = None
+            while self._entries and (len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "index_version": self.index_version
+            }
+
+    @staticmethod
+    def _key(question: str, scope: str) -> str:
+        return f"{scope}|{normalize_question(question)}"
+
+    @staticmethod
+    def _unit(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expired(self, entry: CachedAnswer) -> bool:
+        return time.monotonic() - entry.created_at > self.ttl_seconds
+
+    def _evict_expired(self) -> None:
+        for key in [k for k, e in self._entries.items() if self._expired(e)]:
+            self._remove(key)
+            self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._total_bytes -= entry.size_bytes
+        self._matrix = None
+
+    def _clear(self) -> None:
+        self._entries.clear()
+        self._total_bytes = 0
+        self._matrix = None
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded in-process LRU of query embeddings, optionally backed by a SQLite
+    file so several workers (or containers sharing a volume) reuse each other's results.
+    The file is bounded too: past max_db_bytes of vectors, the least recently used rows
+    are deleted down to 90% of the limit. The async callers use aget_many/aput_many, which
+    answer from memory on the event loop and run the SQLite work on a thread.
+    """
+
+    def __init__(self, max_entries: int = 4096, db_path: Optional[str] = None,
+                 max_db_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self.max_db_bytes = max_db_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_evictions = 0
+        self._entries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Held for the SQLite work only, so memory lookups never wait behind a locked file
+        self._db_lock = threading.Lock()
+        self._db = None
+        self._db_bytes = 0
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=5.0)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings (key TEXT PRIMARY KEY, embedding BLOB, created_at REAL, "
+                "last_used REAL)"
+            )
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(query_embeddings)")]
+            if "last_used" not in columns:
+                # Files written before the size limit
+                self._db.execute("ALTER TABLE query_embeddings ADD COLUMN last_used REAL")
+                self._db.execute("UPDATE query_embeddings SET last_used = created_at")
+            self._db.execute("CREATE INDEX IF NOT EXISTS query_embeddings_last_used ON query_embeddings (last_used)")
+            self._db.commit()
+            self._db_bytes = self._stored_bytes()
+
+    def get(self, key: str) -> Optional[List[float]]:
+        return self.get_many([key])[0]
+
+    def get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        embeddings = self._get_memory(keys)
+        missing = [key for key, embedding in zip(keys, embeddings) if embedding is None]
+        if missing:
+            found = self._get_disk(missing)
+            embeddings = [found.get(key) if embedding is None else embedding for key, embedding in zip(keys, embeddings)]
+        return embeddings
+
+    async def aget_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        """get_many for the event loop: the file is only read (on a thread) for keys not in memory."""
+        embeddings = self._get_memory(keys)
+        missing = [key for key, embedding in zip(keys, embeddings) if embedding is None]
+        if missing:
+            found = await asyncio.get_running_loop().run_in_executor(None, self._get_disk, missing)
+            embeddings = [found.get(key) if embedding is None else embedding for key, embedding in zip(keys, embeddings)]
+        return embeddings
+
+    def put(self, key: str, embedding: List[float]) -> None:
+        self.put_many([(key, embedding)])
+
+    def put_many(self, items: List[Tuple[str, List[float]]]) -> None:
+        with self._lock:
+            for key, embedding in items:
+                self._remember(key, embedding)
+        self._put_disk(items)
+
+    async def aput_many(self, items: List[Tuple[str, List[float]]]) -> None:
+        """put_many for the event loop: remembered at once, written to the file on a thread."""
+        with self._lock:
+            for key, embedding in items:
+                self._remember(key, embedding)
+        if self._db is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._put_disk, items)
+
+    def _get_memory(self, keys: List[str]) -> List[Optional[List[float]]]:
+        embeddings = []
+        with self._lock:
+            for key in keys:
+                embedding = self._entries.get(key)
+                if embedding is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                elif self._db is None:
+                    self.misses += 1
+                embeddings.append(embedding)
+        return embeddings
+
+    def _get_disk(self, keys: List[str]) -> Dict[str, List[float]]:
+        if self._db is None:
+            return {}
+        found = {}
+        with self._db_lock:
+            for key in keys:
+                row = self._db.execute("SELECT embedding FROM query_embeddings WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    found[key] = np.frombuffer(row[0], dtype=np.float32).tolist()
+            if found:
+                # One write (and one commit) per lookup, however many keys it hit
+                now = time.time()
+                self._db.executemany("UPDATE query_embeddings SET last_used = ? WHERE key = ?",
+                                     [(now, key) for key in found])
+                self._db.commit()
+        with self._lock:
+            for key, embedding in found.items():
+                self._remember(key, embedding)
+            self.disk_hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def _put_disk(self, items: List[Tuple[str, List[float]]]) -> None:
+        if self._db is None or not items:
+            return
+        now = time.time()
+        with self._db_lock:
+            for key, embedding in items:
+                blob = np.asarray(embedding, dtype=np.float32).tobytes()
+                # Another worker may have stored the key already; only count the bytes it changes
+                old = self._db.execute("SELECT LENGTH(embedding) FROM query_embeddings WHERE key = ?", (key,)).fetchone()
+                self._db.execute(
+                    "INSERT OR REPLACE INTO query_embeddings (key, embedding, created_at, last_used) VALUES (?, ?, ?, ?)",
+                    (key, blob, now, now)
+                )
+                self._db_bytes += len(blob) - (old[0] if old else 0)
+            if self._db_bytes > self.max_db_bytes:
+                self._evict_db(int(self.max_db_bytes * 0.9))
+            self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "db_path": self.db_path,
+                "db_bytes": self._db_bytes if self._db is not None else 0,
+                "disk_evictions": self.disk_evictions
+            }
+
+    def _stored_bytes(self) -> int:
+        return self._db.execute("SELECT COALESCE(SUM(LENGTH(embedding)), 0) FROM query_embeddings").fetchone()[0]
+
+    def _evict_db(self, target_bytes: int) -> None:
+        # Other workers write to the same file, so the running total is only an estimate
+        self._db_bytes = self._stored_bytes()
+        while self._db_bytes > target_bytes:
+            rows = self._db.execute(
+                "SELECT key, LENGTH(embedding) FROM query_embeddings ORDER BY last_used LIMIT 500"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self._db_bytes <= target_bytes:
+                    break
+                self._db.execute("DELETE FROM query_embeddings WHERE key = ?", (key,))
+                self._db_bytes -= size
+                self.disk_evictions += 1
+
+    def _remember(self, key: str, embedding: List[float]) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = embedding
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class CachedOllamaEmbedding(OllamaEmbedding):
+    """OllamaEmbedding that answers repeated (normalized) queries from a QueryEmbeddingCache."""
+
+    _query_cache: QueryEmbeddingCache = PrivateAttr()
+
+    def __init__(self, query_cache: QueryEmbeddingCache, async_client: Optional[AsyncClient] = None,
+                 **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self._query_cache = query_cache
+        if async_client is not None:
+            # Lets the API share one pooled transport between the LLM and embedding clients
+            self._async_client = async_client
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedOllamaEmbedding"
+
+    @property
+    def query_cache(self) -> QueryEmbeddingCache:
+        return self._query_cache
+
+    def _cache_key(self, query: str) -> str:
+        return f"{self.model_name}:{normalize_question(query)}"
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        key = self._cache_key(query)
+        embedding = self._query_cache.get(key)
+        if embedding is None:
+            embedding = super()._get_query_embedding(query)
+            self._query_cache.put(key, embedding)
+        return embedding
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        key = self._cache_key(query)
+        embedding = (await self._query_cache.aget_many([key]))[0]
+        if embedding is None:
+            embedding = await super()._aget_query_embedding(query)
+            await self._query_cache.aput_many([(key, embedding)])
+        return embedding
+
+    async def aget_query_embedding_batch(self, queries: List[str]) -> List[List[float]]:
+        """Embed several queries, sending every cache miss to Ollama in a single /api/embed call."""
+        keys = [self._cache_key(q) for q in queries]
+        embeddings = await self._query_cache.aget_many(keys)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            fresh = await self.aget_general_text_embeddings([self._format_query(queries[i]) for i in missing])
+            for i, embedding in zip(missing, fresh):
+                embeddings[i] = embedding
+            await self._query_cache.aput_many([(keys[i], embeddings[i]) for i in missing])
+        return embeddings
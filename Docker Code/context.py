@@ -0,0 +1,118 @@
+import re
+from typing import Dict, List, Set
+from llama_index.core.schema import MetadataMode, NodeWithScore, TextNode
+from llama_index.core.utils import get_tokenizer
+
+# Written by ingest.py into every chunk's metadata
+TOKEN_COUNT_KEY = "token_count"
+
+
+def count_tokens(text: str) -> int:
+    """Token count with the same tokenizer LlamaIndex uses to fit prompts into the context window."""
+    return len(get_tokenizer()(text))
+
+
+def node_tokens(node: TextNode) -> int:
+    """Tokens this chunk adds to the prompt; precomputed at ingest, counted here for older collections."""
+    token_count = node.metadata.get(TOKEN_COUNT_KEY)
+    if token_count is None:
+        token_count = count_tokens(node.get_content(metadata_mode=MetadataMode.LLM))
+    return int(token_count)
+
+
+def _shingles(text: str, size: int = 3) -> Set[str]:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _with_token_count(keys: List[str]) -> List[str]:
+    return keys if TOKEN_COUNT_KEY in keys else [*keys, TOKEN_COUNT_KEY]
+
+
+def _merge_span(first: NodeWithScore, second: NodeWithScore) -> NodeWithScore:
+    """Join two chunks of the same document whose character spans touch or overlap (second starts later)."""
+    overlap = max(0, first.node.end_char_idx - second.node.start_char_idx)
+    second_text = second.node.get_content()
+    tail = second_text[overlap:]
+    # Only the part of the second chunk that is new costs extra tokens
+    tail_tokens = round(node_tokens(second.node) * len(tail) / max(len(second_text), 1))
+    merged = TextNode(
+        id_=first.node.node_id,
+        text=first.node.get_content() + tail,
+        metadata={**first.node.metadata, TOKEN_COUNT_KEY: node_tokens(first.node) + tail_tokens},
+        excluded_embed_metadata_keys=_with_token_count(first.node.excluded_embed_metadata_keys),
+        excluded_llm_metadata_keys=_with_token_count(first.node.excluded_llm_metadata_keys),
+        start_char_idx=first.node.start_char_idx,
+        end_char_idx=max(first.node.end_char_idx, second.node.end_char_idx)
+    )
+    return NodeWithScore(node=merged, score=max(first.score or 0.0, second.score or 0.0))
+
+
+def merge_adjacent(nodes: List[NodeWithScore], max_gap_chars: int = 0) -> List[NodeWithScore]:
+    """
+    Merge retrieved chunks that are neighbours in the same source document (chunk_overlap
+    makes them share text) into one passage, so the shared text is sent to the LLM once.
+    Character offsets are per document, so chunks are only compared within one ref_doc_id.
+    """
+    by_document: Dict[str, List[NodeWithScore]] = {}
+    unmergeable = []
+    for node in nodes:
+        ref_doc_id = node.node.ref_doc_id
+        if ref_doc_id is None or node.node.start_char_idx is None or node.node.end_char_idx is None:
+            unmergeable.append(node)
+        else:
+            by_document.setdefault(ref_doc_id, []).append(node)
+
+    merged = list(unmergeable)
+    for document_nodes in by_document.values():
+        document_nodes.sort(key=lambda n: n.node.start_char_idx)
+        current = document_nodes[0]
+        for node in document_nodes[1:]:
+            if node.node.start_char_idx <= current.node.end_char_idx + max_gap_chars:
+                if node.node.end_char_idx > current.node.end_char_idx:
+                    current = _merge_span(current, node)
+                else:
+                    # Fully contained in the current span
+                    current = NodeWithScore(node=current.node, score=max(current.score or 0.0, node.score or 0.0))
+            else:
+                merged.append(current)
+                current = node
+        merged.append(current)
+    return merged
+
+
+def drop_near_duplicates(nodes: List[NodeWithScore], threshold: float = 0.9) -> List[NodeWithScore]:
+    """
+    Keep the best-scoring copy of passages whose word 3-gram Jaccard similarity reaches threshold,
+    e.g. the same verse in two editions of a text.
+    """
+    kept: List[NodeWithScore] = []
+    kept_shingles: List[Set[str]] = []
+    for node in sorted(nodes, key=lambda n: n.score or 0.0, reverse=True):
+        shingles = _shingles(node.node.get_content())
+        if any(len(shingles & other) / len(shingles | other) >= threshold for other in kept_shingles):
+            continue
+        kept.append(node)
+        kept_shingles.append(shingles)
+    return kept
+
+
+def pack_context(nodes: List[NodeWithScore], token_budget: int, dedup_threshold: float = 0.9,
+                 max_gap_chars: int = 0) -> List[NodeWithScore]:
+    """
+    Assemble the chunks sent to the LLM: merge overlapping neighbours, drop near-duplicates,
+    then take passages greedily by score while they fit in token_budget. Passages that do not
+    fit are skipped in favour of smaller, lower-scored ones. The best passage is always kept.
+    """
+    candidates = drop_near_duplicates(merge_adjacent(nodes, max_gap_chars), dedup_threshold)
+    packed = []
+    used = 0
+    for node in candidates:
+        tokens = node_tokens(node.node)
+        if packed and used + tokens > token_budget:
+            continue
+        packed.append(node)
+        used += tokens
+    return packed
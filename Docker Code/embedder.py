@@ -0,0 +1,114 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Optional, Sequence, Tuple
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.schema import BaseNode, MetadataMode
+from embedding_cache import ChunkEmbeddingCache
+
+# Candidate settings tried by the auto-tuner, smallest first
+AUTOTUNE_BATCH_SIZES = (8, 16, 32, 64, 128, 256)
+AUTOTUNE_CONCURRENCIES = (1, 2, 4, 8, 16)
+# Chunks embedded per candidate, at least; larger settings embed two rounds of batches
+AUTOTUNE_SAMPLE_CHUNKS = 256
+# A larger setting is only taken if it is at least this much faster
+AUTOTUNE_MIN_GAIN = 1.1
+PROGRESS_SECONDS = 5.0
+
+
+class BatchEmbedder:
+    """
+    Embeds chunk texts batch_size at a time, one request per batch (Ollama's /api/embed takes a
+    list of inputs), with up to `concurrency` requests in flight on the shared connection pool.
+    With a cache, only texts the model has not embedded before are sent.
+    """
+
+    def __init__(self, embed_model: BaseEmbedding, batch_size: int = 32, concurrency: int = 4,
+                 cache: Optional[ChunkEmbeddingCache] = None):
+        self.embed_model = embed_model
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.cache = cache
+
+    def embed_texts(self, texts: Sequence[str], progress: bool = False) -> List[List[float]]:
+        """Embeddings in input order; with progress, prints the running chunks/sec every few seconds."""
+        if self.cache is None:
+            return self._embed(texts, progress)
+        embeddings = self.cache.get_many(self.embed_model.model_name, texts)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            fresh = self._embed([texts[i] for i in missing], progress)
+            self.cache.put_many(self.embed_model.model_name, [texts[i] for i in missing], fresh)
+            for i, embedding in zip(missing, fresh):
+                embeddings[i] = embedding
+        return embeddings
+
+    def _embed(self, texts: Sequence[str], progress: bool) -> List[List[float]]:
+        batches = [list(texts[start:start + self.batch_size]) for start in range(0, len(texts), self.batch_size)]
+        results: List[List[List[float]]] = [[] for _ in batches]
+        started = last_report = time.perf_counter()
+        done = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            # _get_text_embeddings is one request for the whole batch; get_text_embedding_batch
+            # would split it again by the model's own embed_batch_size
+            futures = {pool.submit(self.embed_model._get_text_embeddings, batch): i for i, batch in enumerate(batches)}
+            for future in as_completed(futures):
+                i = futures[future]
+                results[i] = future.result()
+                done += len(batches[i])
+                now = time.perf_counter()
+                if progress and (now - last_report >= PROGRESS_SECONDS or done == len(texts)):
+                    print(f"  Embedded {done}/{len(texts)} chunks ({done / max(now - started, 1e-9):.1f} chunks/sec)")
+                    last_report = now
+        return [vector for batch in results for vector in batch]
+
+    def embed_nodes(self, nodes: Sequence[BaseNode], progress: bool = True) -> float:
+        """Set the embedding of every node that has none; returns the chunks/sec achieved."""
+        pending = [node for node in nodes if node.embedding is None]
+        if not pending:
+            return 0.0
+        started = time.perf_counter()
+        embeddings = self.embed_texts([node.get_content(metadata_mode=MetadataMode.EMBED) for node in pending], progress)
+        for node, embedding in zip(pending, embeddings):
+            node.embedding = embedding
+        return len(pending) / max(time.perf_counter() - started, 1e-9)
+
+    def autotune(self, texts: Sequence[str], max_concurrency: int = AUTOTUNE_CONCURRENCIES[-1]) -> Tuple[int, int]:
+        """
+        Probe the host for the fastest batch size, then the fastest concurrency at that batch size,
+        doubling each while throughput keeps improving. Adopts and returns (batch_size, concurrency).
+        Probes bypass the cache; texts it already holds are left out of the sample, and if too few
+        remain the current setting is kept.
+        """
+        if self.cache is not None:
+            cached = self.cache.get_many(self.embed_model.model_name, texts)
+            texts = [text for text, embedding in zip(texts, cached) if embedding is None]
+            if len(texts) < AUTOTUNE_SAMPLE_CHUNKS:
+                print(f"  Only {len(texts)} uncached chunks to probe with; keeping the configured setting")
+                return self.batch_size, self.concurrency
+
+        def measure(batch_size: int, concurrency: int) -> float:
+            sample = texts[:max(AUTOTUNE_SAMPLE_CHUNKS, 2 * batch_size * concurrency)]
+            started = time.perf_counter()
+            BatchEmbedder(self.embed_model, batch_size, concurrency).embed_texts(sample)
+            rate = len(sample) / max(time.perf_counter() - started, 1e-9)
+            print(f"  batch {batch_size:>4}, concurrency {concurrency:>3}: {rate:8.1f} chunks/sec")
+            return rate
+
+        # Loads the model first, so the first candidate is not charged for it
+        self.embed_model._get_text_embeddings(list(texts[:1]))
+        best = (AUTOTUNE_BATCH_SIZES[0], 1)
+        best_rate = measure(*best)
+        for batch_size in AUTOTUNE_BATCH_SIZES[1:]:
+            rate = measure(batch_size, 1)
+            if rate < best_rate * AUTOTUNE_MIN_GAIN:
+                break
+            best, best_rate = (batch_size, 1), rate
+        for concurrency in AUTOTUNE_CONCURRENCIES[1:]:
+            if concurrency > max_concurrency:
+                break
+            rate = measure(best[0], concurrency)
+            if rate < best_rate * AUTOTUNE_MIN_GAIN:
+                break
+            best, best_rate = (best[0], concurrency), rate
+        self.batch_size, self.concurrency = best
+        return best
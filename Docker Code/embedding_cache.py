@@ -0,0 +1,213 @@
+import os
+import sys
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "./index/embedding_cache.sqlite")
+EMBED_CACHE_MAX_MB = float(os.getenv("EMBED_CACHE_MAX_MB", "1024"))
+# Eviction goes this far below the limit, so a full cache is not trimmed again on every batch
+EVICT_TO_FRACTION = 0.9
+LOOKUP_BATCH = 500
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ChunkEmbeddingCache:
+    """
+    Persistent cache of chunk embeddings keyed by (model, SHA-256 of the exact text embedded),
+    so re-chunking or rebuilding a collection only sends Ollama the texts it has never seen.
+    Vectors are stored as float32 blobs in one SQLite file; once the stored vectors exceed
+    max_bytes, the least recently used ones are evicted. Lifetime hit/miss/eviction counters
+    are kept in the file too, for `python embedding_cache.py stats`.
+    """
+
+    def __init__(self, path: str, max_bytes: int = int(EMBED_CACHE_MAX_MB * 1024 * 1024)):
+        self.path = path
+        self.max_bytes = max_bytes
+        # This process only; stats() adds the lifetime totals from the file
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._saved = {"hits": 0, "misses": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30.0)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (model TEXT, text_hash TEXT, embedding BLOB, "
+            "last_used REAL, PRIMARY KEY (model, text_hash)) WITHOUT ROWID"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER)")
+        self._db.commit()
+        self._total_bytes = self._db.execute("SELECT COALESCE(SUM(LENGTH(embedding)), 0) FROM embeddings").fetchone()[0]
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Cached embedding per text, None for misses; hits count as a use for eviction."""
+        hashes = [text_hash(text) for text in texts]
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            unique = list(dict.fromkeys(hashes))
+            for start in range(0, len(unique), LOOKUP_BATCH):
+                chunk = unique[start:start + LOOKUP_BATCH]
+                cursor = self._db.execute(
+                    f"SELECT text_hash, embedding FROM embeddings WHERE model = ? AND text_hash IN "
+                    f"({','.join('?' * len(chunk))})", [model, *chunk]
+                )
+                found.update((digest, np.frombuffer(blob, dtype=np.float32).tolist()) for digest, blob in cursor)
+            if found:
+                now = time.time()
+                self._db.executemany("UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                                     ((now, model, digest) for digest in found))
+                self._db.commit()
+            results = [found.get(digest) for digest in hashes]
+            hits = sum(1 for embedding in results if embedding is not None)
+            self.hits += hits
+            self.misses += len(results) - hits
+        return results
+
+    def put_many(self, model: str, texts: Sequence[str], embeddings: Sequence[Sequence[float]]) -> None:
+        now = time.time()
+        rows = {text_hash(text): np.asarray(embedding, dtype=np.float32).tobytes()
+                for text, embedding in zip(texts, embeddings)}
+        digests = list(rows)
+        with self._lock:
+            for start in range(0, len(digests), LOOKUP_BATCH):
+                chunk = digests[start:start + LOOKUP_BATCH]
+                # Replaced rows must not be counted twice
+                self._total_bytes -= self._db.execute(
+                    f"SELECT COALESCE(SUM(LENGTH(embedding)), 0) FROM embeddings WHERE model = ? AND text_hash IN "
+                    f"({','.join('?' * len(chunk))})", [model, *chunk]
+                ).fetchone()[0]
+            self._db.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)",
+                                 ((model, digest, blob, now) for digest, blob in rows.items()))
+            self._total_bytes += sum(len(blob) for blob in rows.values())
+            if self._total_bytes > self.max_bytes:
+                self._evict(int(self.max_bytes * EVICT_TO_FRACTION))
+            self._save_counters()
+            self._db.commit()
+
+    def evict(self, max_bytes: Optional[int] = None) -> int:
+        """Drop least recently used vectors until at most max_bytes (default: the limit) remain."""
+        with self._lock:
+            evicted = self._evict(self.max_bytes if max_bytes is None else max_bytes)
+            self._save_counters()
+            self._db.commit()
+            return evicted
+
+    def clear(self, model: Optional[str] = None) -> int:
+        with self._lock:
+            if model is None:
+                removed = self._db.execute("DELETE FROM embeddings").rowcount
+            else:
+                removed = self._db.execute("DELETE FROM embeddings WHERE model = ?", (model,)).rowcount
+            self._db.commit()
+            self._total_bytes = self._db.execute("SELECT COALESCE(SUM(LENGTH(embedding)), 0) FROM embeddings").fetchone()[0]
+            self._db.execute("VACUUM")
+            return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._save_counters()
+            self._db.commit()
+            lifetime = dict(self._db.execute("SELECT name, value FROM counters"))
+            models = {model: count for model, count in
+                      self._db.execute("SELECT model, COUNT(*) FROM embeddings GROUP BY model")}
+            lookups = self.hits + self.misses
+            lifetime_lookups = lifetime.get("hits", 0) + lifetime.get("misses", 0)
+            return {
+                "path": self.path,
+                "entries": sum(models.values()),
+                "models": models,
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "file_bytes": os.path.getsize(self.path),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "lifetime_hits": lifetime.get("hits", 0),
+                "lifetime_misses": lifetime.get("misses", 0),
+                "lifetime_evictions": lifetime.get("evictions", 0),
+                "lifetime_hit_ratio": round(lifetime.get("hits", 0) / lifetime_lookups, 4) if lifetime_lookups else 0.0
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._save_counters()
+            self._db.commit()
+            self._db.close()
+
+    def _evict(self, target_bytes: int) -> int:
+        evicted = 0
+        while self._total_bytes > target_bytes:
+            rows = self._db.execute(
+                "SELECT model, text_hash, LENGTH(embedding) FROM embeddings ORDER BY last_used LIMIT ?", (LOOKUP_BATCH,)
+            ).fetchall()
+            if not rows:
+                break
+            for model, digest, size in rows:
+                if self._total_bytes <= target_bytes:
+                    break
+                self._db.execute("DELETE FROM embeddings WHERE model = ? AND text_hash = ?", (model, digest))
+                self._total_bytes -= size
+                evicted += 1
+        self.evictions += evicted
+        return evicted
+
+    def _save_counters(self) -> None:
+        """Add what this process counted since the last call to the lifetime totals in the file."""
+        for name in ("hits", "misses", "evictions"):
+            delta = getattr(self, name) - self._saved[name]
+            if delta:
+                self._db.execute("INSERT INTO counters VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + ?",
+                                 (name, delta, delta))
+                self._saved[name] = getattr(self, name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or trim the chunk embedding cache used by ingest.py")
+    parser.add_argument("--path", default=EMBED_CACHE_PATH, help=f"Cache file (default: {EMBED_CACHE_PATH})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="Entries, size and lifetime hit ratio")
+    evict = commands.add_parser("evict", help="Drop least recently used vectors down to a size")
+    evict.add_argument("--max-mb", type=float, default=EMBED_CACHE_MAX_MB)
+    clear = commands.add_parser("clear", help="Remove every vector, or those of one model")
+    clear.add_argument("--model", default=None)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        print(f"No embedding cache at {args.path}")
+        sys.exit(1)
+    cache = ChunkEmbeddingCache(args.path)
+    if args.command == "evict":
+        evicted = cache.evict(int(args.max_mb * 1024 * 1024))
+        print(f"Evicted {evicted} vectors.")
+    elif args.command == "clear":
+        print(f"Removed {cache.clear(args.model)} vectors.")
+
+    stats = cache.stats()
+    cache.close()
+    print("=" * 60)
+    print(f"Embedding cache: {stats['path']}")
+    print("=" * 60)
+    print(f"Entries:       {stats['entries']}")
+    for model, count in stats["models"].items():
+        print(f"  {model}: {count}")
+    print(f"Vectors:       {stats['bytes'] / 1024 / 1024:.1f} MB of {stats['max_bytes'] / 1024 / 1024:.0f} MB "
+          f"(file {stats['file_bytes'] / 1024 / 1024:.1f} MB)")
+    print(f"Hits / misses: {stats['lifetime_hits']} / {stats['lifetime_misses']} "
+          f"(hit ratio {stats['lifetime_hit_ratio']:.1%})")
+    print(f"Evictions:     {stats['lifetime_evictions']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import argparse
+from pathlib import Path
+from typing import Dict, Any, List
+import numpy as np
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores.types import VectorStoreQuery
+from numpy_store import NumpyVectorStore, MANIFEST, QUANTIZATIONS
+
+NUMPY_STORE_PATH = os.getenv("NUMPY_STORE_PATH", "./index/vectors")
+EMBED_DIM = 768 # nomic-embed-text
+
+
+def load_corpus(args) -> np.ndarray:
+    """The ingested vectors if a store exists, else a fixed synthetic corpus shaped like embedding clusters."""
+    store = Path(args.store or NUMPY_STORE_PATH)
+    if (store / MANIFEST).exists() and not args.synthetic:
+        with open(store / MANIFEST, encoding="utf-8") as f:
+            manifest = json.load(f)
+        print(f"Using the {manifest['count']} vectors of {store}")
+        return np.load(store / manifest["embeddings"])
+    print(f"Using a synthetic corpus of {args.vectors} clustered vectors")
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((max(args.vectors // 100, 1), EMBED_DIM), dtype=np.float32)
+    corpus = centers[rng.integers(0, len(centers), args.vectors)]
+    corpus += 0.6 * rng.standard_normal(corpus.shape, dtype=np.float32)
+    return corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+
+
+def make_queries(corpus: np.ndarray, count: int) -> np.ndarray:
+    """Fixed evaluation queries: perturbed copies of seeded corpus rows, like questions near a passage."""
+    rng = np.random.default_rng(1)
+    queries = corpus[rng.choice(len(corpus), count, replace=False)].copy()
+    queries += rng.standard_normal(queries.shape, dtype=np.float32) * (0.5 / np.sqrt(corpus.shape[1]))
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def evaluate(store: NumpyVectorStore, queries: np.ndarray, truth: np.ndarray, top_k: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    recalls: List[float] = []
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        result = store.query(VectorStoreQuery(query_embedding=query.tolist(), similarity_top_k=top_k))
+        latencies.append((time.perf_counter() - started) * 1000)
+        recalls.append(len({int(i) for i in result.ids} & set(expected.tolist())) / top_k)
+    return {
+        "recall": float(np.mean(recalls)),
+        "query_p50_ms": float(np.percentile(latencies, 50)),
+        "search_mb": store.memory_bytes()["search"] / 1024 / 1024
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k versus memory of the quantized NumPy vector store")
+    parser.add_argument("--store", default=None, help=f"Store to take the vectors from (default: {NUMPY_STORE_PATH})")
+    parser.add_argument("--synthetic", action="store_true", help="Use the synthetic corpus even if a store exists")
+    parser.add_argument("--vectors", type=int, default=20000, help="Size of the synthetic corpus")
+    parser.add_argument("--queries", type=int, default=200, help="Evaluation queries")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--quantizations", default=",".join(QUANTIZATIONS), help="Comma-separated: none, float16, int8")
+    parser.add_argument("--rescore-factors", default="0,2,4", help="Comma-separated; 0 means no re-scoring")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Digital Nalanda - Quantized Vector Store Evaluation")
+    print("=" * 60)
+
+    corpus = load_corpus(args)
+    queries = make_queries(corpus, min(args.queries, len(corpus)))
+    # Ground truth: exact float32 cosine top-k
+    truth = np.argsort(-(queries @ corpus.T), axis=1)[:, :args.top_k]
+    nodes = [TextNode(text="", id_=str(i), embedding=vector.tolist()) for i, vector in enumerate(corpus)]
+
+    results = []
+    for quantization in [q.strip() for q in args.quantizations.split(",") if q.strip()]:
+        path = tempfile.mkdtemp(prefix="quantization-eval-")
+        try:
+            store = NumpyVectorStore(path, quantization=quantization)
+            store.add(nodes)
+            store.save()
+            factors = [0] if quantization == "none" else [int(f) for f in args.rescore_factors.split(",")]
+            for factor in factors:
+                store.rescore_factor = factor
+                print(f"Evaluating {quantization} (rescore factor {factor})...")
+                results.append({"quantization": quantization, "rescore_factor": factor,
+                                **evaluate(store, queries, truth, args.top_k)})
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+    if not results:
+        print("Nothing was evaluated.")
+        sys.exit(1)
+
+    print("\n" + "=" * 60)
+    print(f"{len(corpus)} vectors x {corpus.shape[1]} dims, {len(queries)} queries, top-{args.top_k}")
+    print(f"{'quantization':<14}{'rescore':>8}{'search MB':>11}{f'recall@{args.top_k}':>11}{'p50 ms':>9}")
+    for result in results:
+        print(f"{result['quantization']:<14}{result['rescore_factor']:>8}{result['search_mb']:>11.1f}"
+              f"{result['recall']:>11.3f}{result['query_p50_ms']:>9.2f}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import os
+from typing import Dict, Any, Optional
+import httpx
+import chromadb
+from chromadb.config import Settings as ChromaSettings
+from ollama import AsyncClient
+
+# Connection pool configuration (one pool per upstream host)
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "16"))
+OLLAMA_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OLLAMA_MAX_KEEPALIVE_CONNECTIONS", "8"))
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+OLLAMA_REQUEST_TIMEOUT = float(os.getenv("OLLAMA_REQUEST_TIMEOUT", "300"))
+CHROMA_MAX_CONNECTIONS = int(os.getenv("CHROMA_MAX_CONNECTIONS", "16"))
+CHROMA_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("CHROMA_MAX_KEEPALIVE_CONNECTIONS", "8"))
+HTTP_KEEPALIVE_SECONDS = float(os.getenv("HTTP_KEEPALIVE_SECONDS", "60"))
+
+OLLAMA_LIMITS = httpx.Limits(
+    max_connections=OLLAMA_MAX_CONNECTIONS,
+    max_keepalive_connections=OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry=HTTP_KEEPALIVE_SECONDS
+)
+OLLAMA_TIMEOUT = httpx.Timeout(OLLAMA_REQUEST_TIMEOUT, connect=OLLAMA_CONNECT_TIMEOUT)
+
+
+def ollama_async_transport() -> httpx.AsyncHTTPTransport:
+    """Keep-alive transport meant to be shared by every async Ollama client in the process."""
+    return httpx.AsyncHTTPTransport(limits=OLLAMA_LIMITS)
+
+
+def ollama_async_client(base_url: str, transport: httpx.AsyncHTTPTransport) -> AsyncClient:
+    return AsyncClient(host=base_url, timeout=OLLAMA_TIMEOUT, transport=transport)
+
+
+def chroma_http_client(host: str, port: int):
+    """chromadb.HttpClient with keep-alive and bounded connections."""
+    return chromadb.HttpClient(
+        host=host,
+        port=port,
+        settings=ChromaSettings(
+            chroma_http_max_connections=CHROMA_MAX_CONNECTIONS,
+            chroma_http_max_keepalive_connections=CHROMA_MAX_KEEPALIVE_CONNECTIONS,
+            chroma_http_keepalive_secs=HTTP_KEEPALIVE_SECONDS
+        )
+    )
+
+
+def chroma_embedded_client(path: str):
+    """In-process chromadb.PersistentClient: no HTTP hop or serialization, for single-node deployments."""
+    return chromadb.PersistentClient(path=path, settings=ChromaSettings(anonymized_telemetry=False))
+
+
+def open_chroma_client(mode: str, host: str, port: int, path: str):
+    """CHROMA_MODE switch shared by the API, ingest.py and the benchmark: "http" or "embedded"."""
+    if mode == "embedded":
+        return chroma_embedded_client(path)
+    if mode != "http":
+        raise ValueError(f"Unknown CHROMA_MODE {mode!r}; expected 'http' or 'embedded'")
+    return chroma_http_client(host, port)
+
+
+def chroma_location(mode: str, host: str, port: int, path: str) -> str:
+    return f"embedded store at {path}" if mode == "embedded" else f"{host}:{port}"
+
+
+def pool_stats(transport: Any, limits: httpx.Limits) -> Optional[Dict[str, Any]]:
+    """Open / idle / in-use connections of an httpx transport's pool, or None if it cannot be inspected."""
+    pool = getattr(transport, "_pool", None)
+    if pool is None:
+        return None
+    connections = list(pool.connections)
+    idle = sum(1 for connection in connections if connection.is_idle())
+    return {
+        "max_connections": limits.max_connections,
+        "max_keepalive_connections": limits.max_keepalive_connections,
+        "open_connections": len(connections),
+        "idle_connections": idle,
+        "in_use_connections": len(connections) - idle
+    }
+
+
+def chroma_pool_stats(client: Any) -> Optional[Dict[str, Any]]:
+    """Pool statistics for a chroma_http_client(); None for in-process clients."""
+    session = getattr(getattr(client, "_server", None), "_session", None)
+    if session is None:
+        return None
+    return pool_stats(getattr(session, "_transport", None), httpx.Limits(
+        max_connections=CHROMA_MAX_CONNECTIONS,
+        max_keepalive_connections=CHROMA_MAX_KEEPALIVE_CONNECTIONS
+    ))
@@ -1,17 +1,190 @@
 import os
 import sys
+import json
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+from datetime import datetime, timezone
 from pathlib import Path
-import chromadb
-from llama_index.core import VectorStoreIndex, SimpleDirectoryReader, StorageContext
+from typing import Dict, Any, Iterator, List
+from llama_index.core import SimpleDirectoryReader
+from llama_index.core.schema import Document, MetadataMode
+from llama_index.core.readers.file.base import default_file_metadata_func
 from llama_index.vector_stores.chroma import ChromaVectorStore
 from llama_index.embeddings.ollama import OllamaEmbedding
 from llama_index.core.node_parser import SentenceSplitter
+from lexical import BM25Index, BM25Builder
+from ingest_manifest import IngestManifest, file_hash, chunk_id
+from numpy_store import NumpyVectorStore
+from context import TOKEN_COUNT_KEY, count_tokens
+from embedder import BatchEmbedder
+from tei_reader import TEIReader
+from embedding_cache import ChunkEmbeddingCache, EMBED_CACHE_PATH, EMBED_CACHE_MAX_MB
+from http_pool import OLLAMA_LIMITS, OLLAMA_TIMEOUT, OLLAMA_MAX_CONNECTIONS, open_chroma_client, chroma_location
 
 # Configuration
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://host.docker.internal:11434")
 CHROMA_HOST = os.getenv("CHROMA_HOST", "localhost")
 CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8000")) # Changed to 8000 to match standard ChromaDB port
+CHROMA_MODE = os.getenv("CHROMA_MODE", "http") # "embedded" writes straight into CHROMA_PERSIST_PATH
+CHROMA_PERSIST_PATH = os.getenv("CHROMA_PERSIST_PATH", "./chroma_store")
+VECTOR_STORE = os.getenv("VECTOR_STORE", "chroma") # "numpy" writes a memory-mapped store to NUMPY_STORE_PATH instead
+NUMPY_STORE_PATH = os.getenv("NUMPY_STORE_PATH", "./index/vectors")
+NUMPY_STORE_QUANTIZATION = os.getenv("NUMPY_STORE_QUANTIZATION", "none") # "float16" or "int8" for a compact search copy
+NUMPY_STORE_IVF_LISTS = int(os.getenv("NUMPY_STORE_IVF_LISTS", "0")) # k-means lists of the ANN index; 0 builds none
+NUMPY_STORE_PQ_SUBVECTORS = int(os.getenv("NUMPY_STORE_PQ_SUBVECTORS", "0")) # PQ bytes per vector (must divide 768); 0 = IVF-Flat
 DATA_DIR = Path("./data")
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", "./index/bm25")
+INGEST_MANIFEST_PATH = os.getenv("INGEST_MANIFEST_PATH", "./index/ingest_manifest.json")
+INGEST_FULL_REBUILD = os.getenv("INGEST_FULL_REBUILD", "false").lower() == "true" # Ignore the manifest and re-ingest everything
+EMBED_MODEL = "nomic-embed-text"
+CHUNK_SIZE = 512
+CHUNK_OVERLAP = 50
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32")) # Chunks per /api/embed request
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4")) # Embedding requests in flight (capped at OLLAMA_MAX_CONNECTIONS)
+EMBED_AUTOTUNE = os.getenv("EMBED_AUTOTUNE", "false").lower() == "true" # Probe the fastest batch size / concurrency first
+EMBED_AUTOTUNE_MIN_CHUNKS = int(os.getenv("EMBED_AUTOTUNE_MIN_CHUNKS", "2000")) # Smaller runs keep the configured values
+INGEST_BATCH_CHUNKS = int(os.getenv("INGEST_BATCH_CHUNKS", "1024")) # Chunks embedded and stored per step; bounds ingest memory
+TEI_WORKERS = int(os.getenv("TEI_WORKERS", str(os.cpu_count() or 1))) # Processes parsing TEI XML files side by side; 1 parses them here
+CHROMA_DELETE_BATCH = 5000 # Ids per Chroma delete call; stays under its max batch size
+DHARMAGANJ_ROOT = "dharmaganj"
+INGEST_SUFFIXES = (".txt", ".md", ".xml") # .xml files are TEI documents (the SARIT treatises)
+# Catalog metadata attached to every chunk; kept out of the embedded text
+CATALOG_METADATA_KEYS = ["building", "domain", "work", "lipi", "source"]
+
+def load_catalog() -> Dict[str, Dict[str, Any]]:
+    """
+    Per-file catalog entries keyed by their path from the dharmaganj root, merged
+    from bagdevibhandar/master_catalog.json and the sacred-texts migration log.
+    """
+    catalog = {}
+    root = DATA_DIR / DHARMAGANJ_ROOT
+    master_catalog = root / "bagdevibhandar" / "master_catalog.json"
+    if master_catalog.exists():
+        with open(master_catalog, encoding="utf-8") as f:
+            for entry in json.load(f).get("catalog", []):
+                catalog[entry["path"]] = {
+                    "lipi": entry.get("lipi", ""),
+                    "source": "SARIT" if entry.get("shakha") == "SARIT" else "local"
+                }
+    migration_log = root / "migration_log_sacred_texts.json"
+    if migration_log.exists():
+        with open(migration_log, encoding="utf-8") as f:
+            for category in json.load(f).get("details", {}).values():
+                for entry in category.get("files", []):
+                    catalog.setdefault(f"{category['target']}/{entry['filename']}", {})["source"] = "sacred-texts.com"
+    return catalog
+
+def detect_lipi(file_path: str) -> str:
+    """Guess the script from the first few KB: Devanagari if it dominates the letters, else Latin."""
+    with open(file_path, encoding="utf-8", errors="ignore") as f:
+        sample = f.read(4096)
+    letters = [c for c in sample if c.isalpha()]
+    devanagari = sum(1 for c in letters if "\u0900" <= c <= "\u097f")
+    return "Devanagari" if letters and devanagari / len(letters) > 0.5 else "Latin"
+
+def make_file_metadata(catalog: Dict[str, Dict[str, Any]]):
+    """SimpleDirectoryReader file_metadata hook adding building, domain, work, lipi and source."""
+    def file_metadata(file_path: str) -> Dict[str, Any]:
+        metadata = default_file_metadata_func(file_path)
+        parts = Path(file_path).resolve().relative_to(DATA_DIR.resolve()).parts
+        building, domain, entry = "unclassified", "unclassified", {}
+        if DHARMAGANJ_ROOT in parts:
+            i = parts.index(DHARMAGANJ_ROOT)
+            # dharmaganj/<building>/<domain>/[raw|clean/]<file>
+            if len(parts) > i + 2:
+                building = parts[i + 1]
+            if len(parts) > i + 3:
+                domain = parts[i + 2]
+            entry = catalog.get("/".join(parts[i:]), {})
+        metadata.update({
+            "building": building,
+            "domain": domain,
+            "work": Path(file_path).stem,
+            "lipi": entry.get("lipi") or detect_lipi(file_path),
+            "source": entry.get("source", "local")
+        })
+        return metadata
+    return file_metadata
+
+def read_tei_file(path: str, catalog: Dict[str, Dict[str, Any]]) -> List[Document]:
+    """One TEI file's documents with the usual file metadata; runs in a worker process."""
+    return SimpleDirectoryReader(
+        input_files=[path],
+        file_metadata=make_file_metadata(catalog),
+        file_extractor={".xml": TEIReader()}
+    ).load_data()
+
+def iter_documents(paths: List[Path], catalog: Dict[str, Dict[str, Any]]) -> Iterator[List[Document]]:
+    """
+    Each file's documents, one file at a time (files that yield none are skipped). TEI files
+    are parsed by TEI_WORKERS processes, at most two files per worker ahead of the caller so
+    memory stays bounded, while the .txt/.md files are read here in between.
+    """
+    xml_paths = [str(path) for path in paths if path.suffix.lower() == ".xml"]
+    text_paths = [str(path) for path in paths if path.suffix.lower() != ".xml"]
+    texts = iter(())
+    if text_paths:
+        texts = SimpleDirectoryReader(input_files=text_paths, file_metadata=make_file_metadata(catalog)).iter_data()
+    workers = min(TEI_WORKERS, len(xml_paths))
+    if workers <= 1:
+        yield from texts
+        for path in xml_paths:
+            documents = read_tei_file(path, catalog)
+            if documents:
+                yield documents
+        return
+
+    queued = iter(xml_paths)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+
+        def parsed() -> Iterator[List[Document]]:
+            documents = pending.popleft().result()
+            for path in islice(queued, 2 * workers - len(pending)):
+                pending.append(pool.submit(read_tei_file, path, catalog))
+            if documents:
+                yield documents
+
+        pending.extend(pool.submit(read_tei_file, path, catalog) for path in islice(queued, 2 * workers))
+        for documents in texts:
+            yield documents
+            while pending and pending[0].done():
+                yield from parsed()
+        while pending:
+            yield from parsed()
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process so far, in MB (0 where the platform cannot tell)."""
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, KB on Linux
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+def clear_vector_store(vector_store, chroma_collection=None) -> None:
+    """Remove every chunk before a full rebuild (Chroma in batches, it caps the ids per call)."""
+    if chroma_collection is None:
+        vector_store.clear()
+        return
+    while True:
+        ids = chroma_collection.get(limit=CHROMA_DELETE_BATCH, include=[])["ids"]
+        if not ids:
+            break
+        chroma_collection.delete(ids=ids)
+
+def delete_chunks(vector_store, node_ids: List[str], chroma_collection=None) -> None:
+    """Remove the chunks of changed and deleted files (applied on save for the NumPy store)."""
+    if chroma_collection is None:
+        vector_store.delete_nodes(node_ids)
+        return
+    for start in range(0, len(node_ids), CHROMA_DELETE_BATCH):
+        chroma_collection.delete(ids=node_ids[start:start + CHROMA_DELETE_BATCH])
 
 def main():
     print("=" * 60)
@@ -22,56 +195,223 @@ def main():
     if not DATA_DIR.exists():
         DATA_DIR.mkdir(parents=True, exist_ok=True)
         print(f"Created directory at {DATA_DIR.absolute()}")
-        print("Please drop your .txt or .md scripture files in there and run again.")
+        print("Please drop your .txt, .md or TEI .xml scripture files in there and run again.")
         sys.exit(0)
 
-    # 2. Load Documents using LlamaIndex native reader
-    print("Reading files from ./data...")
-    documents = SimpleDirectoryReader(input_dir=str(DATA_DIR), required_exts=[".txt", ".md"]).load_data()
-    
-    if not documents:
-        print("No .txt or .md documents found in the data directory.")
+    # 2. Hash every file and compare with what the last run ingested
+    files = {
+        path.relative_to(DATA_DIR).as_posix(): path
+        for path in sorted(DATA_DIR.rglob("*"))
+        if path.is_file() and path.suffix.lower() in INGEST_SUFFIXES
+        # Hidden files and directories are skipped, as SimpleDirectoryReader does
+        and not any(part.startswith(".") for part in path.relative_to(DATA_DIR).parts)
+    }
+    if not files:
+        print("No .txt, .md or .xml documents found in the data directory.")
         sys.exit(0)
-        
-    print(f"Loaded {len(documents)} document pages/files.")
+    print(f"Hashing {len(files)} files in ./data...")
+    hashes = {name: file_hash(path) for name, path in files.items()}
+    manifest = IngestManifest(INGEST_MANIFEST_PATH, {
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "embed_model": EMBED_MODEL,
+        "vector_store": VECTOR_STORE
+    })
 
-    # 3. Intelligent Scripture Chunking
-    # chunk_size=512 tokens is roughly 380 words (perfect for a verse + commentary)
-    # chunk_overlap=50 tokens ensures verses aren't cleanly severed from context
-    text_parser = SentenceSplitter(
-        chunk_size=512,
-        chunk_overlap=50,
+    # 3. Initialize the vector store (ChromaDB, or the NumPy store that is saved in step 9)
+    chroma_collection = None
+    if VECTOR_STORE == "numpy":
+        print(f"\nOpening NumPy vector store at {NUMPY_STORE_PATH}...")
+        vector_store = NumpyVectorStore(
+            NUMPY_STORE_PATH,
+            quantization=NUMPY_STORE_QUANTIZATION,
+            ivf_lists=NUMPY_STORE_IVF_LISTS,
+            pq_subvectors=NUMPY_STORE_PQ_SUBVECTORS
+        )
+        stored_chunks = vector_store.count
+    else:
+        print(f"\nConnecting to ChromaDB ({chroma_location(CHROMA_MODE, CHROMA_HOST, CHROMA_PORT, CHROMA_PERSIST_PATH)})...")
+        try:
+            chroma_client = open_chroma_client(CHROMA_MODE, CHROMA_HOST, CHROMA_PORT, CHROMA_PERSIST_PATH)
+            chroma_collection = chroma_client.get_or_create_collection("digital_nalanda")
+            vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
+            print("Successfully connected to ChromaDB.")
+        except Exception as e:
+            print(f"CRITICAL: Could not connect to ChromaDB. Ensure your docker container is running. Error: {e}")
+            sys.exit(1)
+        stored_chunks = chroma_collection.count()
+    print(f"Store currently holds {stored_chunks} chunks.")
+
+    # 4. Decide between an incremental update and a full rebuild
+    full_rebuild = (
+        INGEST_FULL_REBUILD
+        or not manifest.valid
+        or stored_chunks == 0
+        or BM25Index.mtime(LEXICAL_INDEX_PATH) is None
     )
+    if full_rebuild:
+        print("Full rebuild: re-ingesting every file.")
+        changed, deleted = list(files), []
+        clear_vector_store(vector_store, chroma_collection)
+        manifest.files = {}
+    else:
+        changed, unchanged, deleted = manifest.diff(hashes)
+        print(f"{len(changed)} new or changed, {len(unchanged)} unchanged, {len(deleted)} deleted files.")
+        if not changed and not deleted:
+            print("\nIndex is up to date; nothing to ingest.")
+            sys.exit(0)
 
-    # 4. Initialize ChromaDB
-    print(f"\nConnecting to ChromaDB at {CHROMA_HOST}:{CHROMA_PORT}...")
-    try:
-        chroma_client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
-        chroma_collection = chroma_client.get_or_create_collection("digital_nalanda")
-        vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
-        storage_context = StorageContext.from_defaults(vector_store=vector_store)
-        print("Successfully connected to ChromaDB.")
-    except Exception as e:
-        print(f"CRITICAL: Could not connect to ChromaDB. Ensure your docker container is running. Error: {e}")
-        sys.exit(1)
+    removed_ids = manifest.chunk_ids(changed + deleted)
+    if removed_ids:
+        print(f"Removing {len(removed_ids)} chunks of changed and deleted files...")
+        delete_chunks(vector_store, removed_ids, chroma_collection)
 
     # 5. Initialize Embedding Model (Routing to Host OS)
-    print(f"Initializing Nomic Embeddings via host Ollama...")
+    print("Initializing Nomic Embeddings via host Ollama...")
     embed_model = OllamaEmbedding(
-        model_name="nomic-embed-text",
-        base_url=OLLAMA_BASE_URL
+        model_name=EMBED_MODEL,
+        base_url=OLLAMA_BASE_URL,
+        client_kwargs={"timeout": OLLAMA_TIMEOUT, "limits": OLLAMA_LIMITS} # Keep-alive pool for the many embed calls
     )
+    # Chunks embedded by any earlier run (same model, same text) come from disk instead of Ollama
+    embedding_cache = None
+    if EMBED_CACHE_PATH:
+        embedding_cache = ChunkEmbeddingCache(EMBED_CACHE_PATH, int(EMBED_CACHE_MAX_MB * 1024 * 1024))
+        cache_stats = embedding_cache.stats()
+        print(f"Embedding cache at {EMBED_CACHE_PATH}: {cache_stats['entries']} vectors "
+              f"({cache_stats['bytes'] / 1024 / 1024:.1f} of {EMBED_CACHE_MAX_MB:.0f} MB)")
+    # Batched requests, several in flight
+    embedder = BatchEmbedder(embed_model, EMBED_BATCH_SIZE, min(EMBED_CONCURRENCY, OLLAMA_MAX_CONNECTIONS),
+                             cache=embedding_cache)
+
+    # 6. Intelligent Scripture Chunking
+    # chunk_size=512 tokens is roughly 380 words (perfect for a verse + commentary)
+    # chunk_overlap=50 tokens ensures verses aren't cleanly severed from context
+    document_files = {}
 
-    # 6. Build the Index (This executes chunking, embedding, and storing)
-    print("\nStarting ingestion process (this may take a moment depending on file size)...")
-    index = VectorStoreIndex.from_documents(
-        documents,
-        storage_context=storage_context,
-        embed_model=embed_model,
-        transformations=[text_parser], # Apply our specific chunking rules
-        show_progress=True
+    def content_chunk_id(position: int, document) -> str:
+        # Same file content, same chunk ids: re-ingesting never leaves duplicates behind
+        return chunk_id(document.id_, position, hashes[document_files[document.id_]])
+
+    text_parser = SentenceSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        id_func=content_chunk_id
     )
 
+    # 7. Stream: read a file -> chunk it -> embed and store full batches -> let go of them,
+    # so memory stays bounded by INGEST_BATCH_CHUNKS whatever the size of ./data
+    lexical_builder = BM25Builder()
+    batch = []
+    tuned = not EMBED_AUTOTUNE
+    stored = files_read = bytes_read = 0
+    started = time.perf_counter()
+
+    def flush():
+        nonlocal batch, tuned, stored
+        if not tuned and len(batch) >= EMBED_AUTOTUNE_MIN_CHUNKS:
+            print("\nAuto-tuning embedding batch size and concurrency...")
+            embedder.autotune([node.get_content(metadata_mode=MetadataMode.EMBED) for node in batch],
+                              max_concurrency=OLLAMA_MAX_CONNECTIONS)
+            print(f"Best: EMBED_BATCH_SIZE={embedder.batch_size} EMBED_CONCURRENCY={embedder.concurrency}\n")
+        tuned = True
+        embedder.embed_nodes(batch, progress=False)
+        if not full_rebuild:
+            # Any copy of these chunks that a run interrupted before writing the manifest already stored
+            delete_chunks(vector_store, [node.node_id for node in batch], chroma_collection)
+        vector_store.add(batch)
+        # The lexical index keeps the postings, not the texts
+        for node in batch:
+            lexical_builder.add(node.node_id, node.get_content(), node.metadata)
+        stored += len(batch)
+        batch = []
+        elapsed = time.perf_counter() - started
+        print(f"  {stored} chunks stored from {files_read}/{len(changed)} files "
+              f"({stored / elapsed:.1f} chunks/sec, peak RSS {peak_rss_mb():.0f} MB)")
+
+    if changed:
+        print(f"\nIngesting {len(changed)} files from ./data ({embedder.batch_size} chunks per embedding request, "
+              f"{embedder.concurrency} concurrent requests)...")
+        # One file's documents at a time (a TEI file yields one document per section)
+        for documents in iter_documents([files[name] for name in changed], load_catalog()):
+            name = Path(documents[0].metadata["file_path"]).resolve().relative_to(DATA_DIR.resolve()).as_posix()
+            files_read += 1
+            bytes_read += files[name].stat().st_size
+            # Stable document ids (path from ./data, "#k" for files the reader splits into several documents)
+            document_files.clear()
+            for k, document in enumerate(documents):
+                document.id_ = name if len(documents) == 1 else f"{name}#{k}"
+                document_files[document.id_] = name
+                # Filterable in Chroma, but not part of the embedded text; the LLM still sees the work title
+                document.excluded_embed_metadata_keys.extend(CATALOG_METADATA_KEYS)
+                document.excluded_llm_metadata_keys.extend(k for k in CATALOG_METADATA_KEYS if k != "work")
+                # Used by the API to pack the prompt; never shown to the embedder or the LLM
+                document.excluded_embed_metadata_keys.append(TOKEN_COUNT_KEY)
+                document.excluded_llm_metadata_keys.append(TOKEN_COUNT_KEY)
+
+            # Chunk once, so the vector store and the lexical index see exactly the same nodes
+            nodes = text_parser.get_nodes_from_documents(documents)
+            for node in nodes:
+                # Prompt tokens of the chunk as the LLM will see it, so the API can fill its token budget without re-tokenizing
+                node.metadata[TOKEN_COUNT_KEY] = count_tokens(node.get_content(metadata_mode=MetadataMode.LLM))
+            manifest.record(name, hashes[name], [node.node_id for node in nodes])
+            batch.extend(nodes)
+            del documents, nodes
+            if len(batch) >= (INGEST_BATCH_CHUNKS if tuned else max(INGEST_BATCH_CHUNKS, EMBED_AUTOTUNE_MIN_CHUNKS)):
+                flush()
+        if batch:
+            flush()
+    ingest_seconds = time.perf_counter() - started
+    print(f"Stored {stored} chunks from {files_read} files.")
+    if embedding_cache is not None:
+        cache_stats = embedding_cache.stats()
+        print(f"Embedding cache: {cache_stats['hits']} hits, {cache_stats['misses']} sent to Ollama "
+              f"(hit ratio {cache_stats['hit_ratio']:.1%}), {cache_stats['evictions']} evicted, "
+              f"{cache_stats['bytes'] / 1024 / 1024:.1f} MB")
+        embedding_cache.close()
+
+    # 8. Update (or build) the BM25 inverted index over the same chunks for hybrid / lexical retrieval
+    if full_rebuild:
+        print(f"Building lexical (BM25) index at {LEXICAL_INDEX_PATH}...")
+        lexical_index = lexical_builder.build()
+    else:
+        print(f"Updating lexical (BM25) index at {LEXICAL_INDEX_PATH}...")
+        lexical_index = BM25Index.load(LEXICAL_INDEX_PATH).merge(removed_ids + lexical_builder.node_ids,
+                                                                 lexical_builder.build())
+    # Release the builder's postings; flush() still names it, so it is reset rather than deleted
+    lexical_builder = None
+    lexical_index.save(LEXICAL_INDEX_PATH)
+    print(f"Lexical index holds {len(lexical_index)} chunks and {len(lexical_index.vocabulary)} terms.")
+    del lexical_index
+
+    # 9. Stamp a new index version so the API drops answers cached against the old collection
+    index_version = datetime.now(timezone.utc).isoformat()
+    if VECTOR_STORE == "numpy":
+        # Writes the embeddings, node table and ANN index as a new generation; running API workers pick it up on their next query
+        if NUMPY_STORE_IVF_LISTS:
+            print(f"Training the IVF index ({NUMPY_STORE_IVF_LISTS} lists, PQ subvectors: {NUMPY_STORE_PQ_SUBVECTORS})...")
+        vector_store.save(index_version=index_version)
+        print(f"NumPy vector store saved with {vector_store.count} chunks "
+              f"({NUMPY_STORE_QUANTIZATION} quantization), index_version {index_version}")
+    else:
+        chroma_collection.modify(metadata={**(chroma_collection.metadata or {}), "index_version": index_version})
+        print(f"Collection index_version set to {index_version}")
+
+    # 10. Record what was ingested last, so an interrupted run is simply redone next time
+    for name in deleted:
+        manifest.forget(name)
+    for name in changed:
+        if name not in manifest.files or manifest.files[name]["sha256"] != hashes[name]:
+            # Files the reader returned nothing for
+            manifest.record(name, hashes[name], [])
+    manifest.save()
+    print(f"Ingest manifest written to {INGEST_MANIFEST_PATH} ({len(manifest.files)} files).")
+
+    total_seconds = time.perf_counter() - started
+    print(f"\nRun: {files_read} files ({bytes_read / 1024 / 1024:.1f} MB) -> {stored} chunks in {total_seconds:.1f}s; "
+          f"{stored / max(ingest_seconds, 1e-9):.1f} chunks/sec and {bytes_read / 1024 / 1024 / max(ingest_seconds, 1e-9):.2f} MB/sec "
+          f"while streaming; peak RSS {peak_rss_mb():.0f} MB")
+
     print("\n" + "=" * 60)
     print("Ingestion completely successful! Data is ready for querying.")
     print("=" * 60)
@@ -0,0 +1,73 @@
+import os
+import json
+import uuid
+import hashlib
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+# Bump when chunk ids or chunk metadata change meaning, so the next run rebuilds everything
+MANIFEST_FORMAT = 1
+HASH_BLOCK_BYTES = 1024 * 1024
+
+
+def file_hash(path: Path) -> str:
+    """SHA-256 of the file's bytes."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(doc_id: str, position: int, digest: str) -> str:
+    """Deterministic chunk id: the same chunk of the same file content gets the same id on every run."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"nalanda:{doc_id}#{position}:{digest}"))
+
+
+class IngestManifest:
+    """
+    What the last ingest run stored: the content hash of every file under ./data and the ids
+    of the chunks it produced, plus the chunking settings they were produced with. ingest.py
+    compares it with the files on disk to embed only new and changed files and to delete the
+    chunks of changed and removed ones.
+    """
+
+    def __init__(self, path: str, settings: Dict[str, Any]):
+        self.path = Path(path)
+        self.settings = {**settings, "format": MANIFEST_FORMAT}
+        self.files: Dict[str, Dict[str, Any]] = {}
+        # False when there was no manifest, or it was written with other settings: everything is re-ingested
+        self.valid = False
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved.get("settings") == self.settings:
+                self.files = saved["files"]
+                self.valid = True
+
+    def diff(self, hashes: Dict[str, str]) -> Tuple[List[str], List[str], List[str]]:
+        """
+        Split files into (new or changed, unchanged, deleted) against the current content hashes;
+        one dict lookup per file on either side, so this stays linear in the number of files.
+        """
+        changed, unchanged = [], []
+        for name, digest in hashes.items():
+            (unchanged if self.files.get(name, {}).get("sha256") == digest else changed).append(name)
+        deleted = [name for name in self.files if name not in hashes]
+        return changed, unchanged, deleted
+
+    def chunk_ids(self, names: List[str]) -> List[str]:
+        return [node_id for name in names for node_id in self.files.get(name, {}).get("chunks", [])]
+
+    def record(self, name: str, digest: str, chunk_ids: List[str]) -> None:
+        self.files[name] = {"sha256": digest, "chunks": chunk_ids}
+
+    def forget(self, name: str) -> None:
+        self.files.pop(name, None)
+
+    def save(self) -> None:
+        """Written only after the vector store and lexical index are updated, and replaced atomically."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path.with_name(self.path.name + ".tmp"), "w", encoding="utf-8") as f:
+            json.dump({"settings": self.settings, "files": self.files}, f, ensure_ascii=False, indent=1)
+        os.replace(self.path.with_name(self.path.name + ".tmp"), self.path)
@@ -0,0 +1,162 @@
+import shutil
+from pathlib import Path
+from typing import Optional, Tuple
+import numpy as np
+
+# Vectors assigned per matrix product while training and building the lists
+ASSIGN_BLOCK_ROWS = 16384
+# Codewords per product-quantization subspace, so each code is one byte
+PQ_CODEWORDS = 256
+IVF_ARRAYS = ("centroids", "list_offsets", "list_rows", "codebooks", "codes")
+
+
+def _assign(data: np.ndarray, centroids: np.ndarray, spherical: bool) -> np.ndarray:
+    """Nearest centroid of every row: largest inner product (spherical) or smallest L2 distance."""
+    # argmin |x - c|^2 = argmax x.c - |c|^2 / 2
+    bias = 0.0 if spherical else 0.5 * (centroids ** 2).sum(axis=1)
+    labels = np.empty(len(data), dtype=np.int64)
+    for start in range(0, len(data), ASSIGN_BLOCK_ROWS):
+        block = np.asarray(data[start:start + ASSIGN_BLOCK_ROWS], dtype=np.float32)
+        labels[start:start + len(block)] = np.argmax(block @ centroids.T - bias, axis=1)
+    return labels
+
+
+def kmeans(data: np.ndarray, k: int, iterations: int, rng: np.random.Generator, spherical: bool = False) -> np.ndarray:
+    """Lloyd's k-means; spherical keeps unit-length centroids for inner-product search. Empty clusters are re-seeded."""
+    centroids = data[rng.choice(len(data), k, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        labels = _assign(data, centroids, spherical)
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=k)
+        empty = counts == 0
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[~empty]
+        centroids = np.zeros_like(centroids)
+        centroids[~empty] = np.add.reduceat(data[order], starts, axis=0) / counts[~empty, None]
+        centroids[empty] = data[rng.choice(len(data), int(empty.sum()), replace=False)]
+        if spherical:
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file index over the unit-normalized vectors of a NumpyVectorStore.
+
+    Spherical k-means splits the vectors into lists around n_lists centroids; a query only
+    scores the rows of its nprobe closest lists. With product quantization the residuals
+    (vector - centroid) are also encoded as pq_subvectors one-byte codes, stored in list
+    order, and scored from a per-query lookup table without touching the vectors at all:
+    q.x = q.c + sum_j q_j . codebook_j[code_j].
+    """
+
+    def __init__(self, centroids: np.ndarray, list_offsets: np.ndarray, list_rows: np.ndarray,
+                 codebooks: Optional[np.ndarray] = None, codes: Optional[np.ndarray] = None):
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+        self.codebooks = codebooks
+        self.codes = codes
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in IVF_ARRAYS if getattr(self, name) is not None)
+
+    @classmethod
+    def train(cls, vectors: np.ndarray, n_lists: int, pq_subvectors: int = 0, iterations: int = 20,
+              sample_size: int = 100000, seed: int = 0) -> "IVFIndex":
+        rng = np.random.default_rng(seed)
+        n_lists = max(1, min(n_lists, len(vectors)))
+        sample = vectors[np.sort(rng.choice(len(vectors), min(sample_size, len(vectors)), replace=False))]
+        centroids = kmeans(sample, n_lists, iterations, rng, spherical=True)
+
+        labels = _assign(vectors, centroids, spherical=True)
+        list_rows = np.argsort(labels, kind="stable").astype(np.int32)
+        list_offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=n_lists))]).astype(np.int64)
+        if not pq_subvectors:
+            return cls(centroids, list_offsets, list_rows)
+
+        dim = vectors.shape[1]
+        if dim % pq_subvectors:
+            raise ValueError(f"pq_subvectors ({pq_subvectors}) must divide the embedding dimension ({dim})")
+        width = dim // pq_subvectors
+        # Residuals are only ever formed for a sample or a block of rows, never for the whole matrix
+        sampled = np.sort(rng.choice(len(vectors), min(sample_size, len(vectors)), replace=False))
+        sample_residuals = np.asarray(vectors[sampled], dtype=np.float32) - centroids[labels[sampled]]
+        codewords = min(PQ_CODEWORDS, len(sample_residuals))
+        codebooks = np.stack([
+            kmeans(sample_residuals[:, j * width:(j + 1) * width], codewords, iterations, rng)
+            for j in range(pq_subvectors)
+        ])
+        del sample_residuals
+        codes = np.empty((len(list_rows), pq_subvectors), dtype=np.uint8)
+        for start in range(0, len(list_rows), ASSIGN_BLOCK_ROWS):
+            # Read the block's rows in ascending order (sequential on a memory map), store codes in list order
+            order = np.argsort(list_rows[start:start + ASSIGN_BLOCK_ROWS])
+            rows = list_rows[start:start + ASSIGN_BLOCK_ROWS][order]
+            block = np.asarray(vectors[rows], dtype=np.float32) - centroids[labels[rows]]
+            for j in range(pq_subvectors):
+                codes[start + order, j] = _assign(block[:, j * width:(j + 1) * width], codebooks[j], spherical=False)
+        return cls(centroids, list_offsets, list_rows, codebooks, codes)
+
+    def save(self, directory: Path) -> None:
+        """Write one .npy per array into a fresh directory, replacing any previous one."""
+        tmp = directory.with_name(directory.name + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        for name in IVF_ARRAYS:
+            array = getattr(self, name)
+            if array is not None:
+                np.save(tmp / f"{name}.npy", array)
+        shutil.rmtree(directory, ignore_errors=True)
+        tmp.rename(directory)
+
+    @classmethod
+    def load(cls, directory: Path) -> "IVFIndex":
+        """Centroids and codebooks are small and read into memory; the per-row arrays are memory-mapped."""
+        arrays = {}
+        for name in IVF_ARRAYS:
+            path = directory / f"{name}.npy"
+            if path.exists():
+                arrays[name] = np.load(path, mmap_mode="r" if name in ("list_rows", "codes") else None)
+        return cls(**arrays)
+
+    def search(self, queries: np.ndarray, top_k: int, nprobe: int, mask: Optional[np.ndarray] = None,
+               matrix: Optional[np.ndarray] = None, scales: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k over the rows of each query's nprobe closest lists, scored from the PQ codes if
+        there are any, else exactly against matrix (float32 vectors, or quantized codes with
+        their scales). Returns (rows, scores) like NumpyVectorStore._search; row -1 pads misses.
+        """
+        nprobe = min(nprobe, self.n_lists)
+        centroid_scores = queries @ self.centroids.T
+        probes = np.argpartition(-centroid_scores, nprobe - 1, axis=1)[:, :nprobe]
+        best_rows = np.full((len(queries), top_k), -1, dtype=np.int64)
+        best_scores = np.full((len(queries), top_k), -np.inf, dtype=np.float32)
+        for i, (query, lists) in enumerate(zip(queries, probes)):
+            spans = [(self.list_offsets[l], self.list_offsets[l + 1]) for l in lists]
+            positions = np.concatenate([np.arange(start, end) for start, end in spans])
+            rows = np.asarray(self.list_rows[positions], dtype=np.int64)
+            list_scores = np.repeat(centroid_scores[i, lists], [end - start for start, end in spans])
+            if mask is not None:
+                keep = mask[rows]
+                rows, positions, list_scores = rows[keep], positions[keep], list_scores[keep]
+            if self.codes is not None:
+                tables = np.einsum("jw,jcw->jc", query.reshape(len(self.codebooks), -1), self.codebooks)
+                codes = np.asarray(self.codes[positions])
+                scores = list_scores + tables[np.arange(len(tables)), codes].sum(axis=1)
+            else:
+                rows = np.sort(rows) # Ascending rows read the memory map sequentially
+                scores = np.asarray(matrix[rows], dtype=np.float32) @ query
+                if scales is not None:
+                    scores *= scales[rows]
+            if len(rows) > top_k:
+                top = np.argpartition(-scores, top_k - 1)[:top_k]
+                rows, scores = rows[top], scores[top]
+            order = np.argsort(-scores, kind="stable")
+            best_rows[i, :len(order)] = rows[order]
+            best_scores[i, :len(order)] = scores[order]
+        return best_rows, best_scores
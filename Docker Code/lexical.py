@@ -0,0 +1,215 @@
+import os
+import re
+import json
+import unicodedata
+from array import array
+from collections import Counter, defaultdict
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, List, Dict, Any, Optional, Tuple, Callable
+import numpy as np
+
+# Verse references such as "2.47" or "1.1.3" stay whole; everything else splits on non-word
+# characters. Devanagari vowel signs and IAST combining marks are kept inside the word.
+TOKEN_PATTERN = re.compile(r"\d+(?:\.\d+)+|[\w\u0300-\u036f\u0900-\u097f]+")
+
+
+# Words recur constantly, so folding is memoized (a bounded cache: at most a few MB)
+@lru_cache(maxsize=65536)
+def fold_diacritics(token: str) -> str:
+    """ṛta -> rta, kṛṣṇa -> krsna; non-Latin scripts are returned unchanged."""
+    folded = "".join(c for c in unicodedata.normalize("NFD", token) if unicodedata.category(c) != "Mn")
+    return folded if folded.isascii() else token
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased tokens; IAST words also emit their ASCII-folded form so either spelling matches."""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(unicodedata.normalize("NFC", text).lower()):
+        tokens.append(token)
+        folded = fold_diacritics(token)
+        if folded != token:
+            tokens.append(folded)
+    return tokens
+
+
+POSTING_ARRAYS = ("offsets", "doc_indices", "term_freqs", "doc_lengths")
+
+
+class BM25Index:
+    """
+    Okapi BM25 over the ingested chunks, stored as a CSR-style inverted index:
+    one .npy file each for the term offsets, document numbers, term frequencies and
+    document lengths, and `docs.json` for the vocabulary, chunk ids and chunk metadata
+    (for filtering). The arrays are memory-mapped read-only on load, so several API
+    workers share one copy of the postings through the page cache.
+    """
+
+    def __init__(self, vocabulary: List[str], offsets: np.ndarray, doc_indices: np.ndarray,
+                 term_freqs: np.ndarray, doc_lengths: np.ndarray, node_ids: List[str],
+                 metadatas: List[Dict[str, Any]], k1: float = 1.5, b: float = 0.75):
+        self.vocabulary = vocabulary
+        self.term_ids = {term: i for i, term in enumerate(vocabulary)}
+        self.offsets = offsets
+        self.doc_indices = doc_indices
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        self.node_ids = node_ids
+        self.metadatas = metadatas
+        self.k1 = k1
+        self.b = b
+        self.avg_doc_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+
+    def __len__(self) -> int:
+        return len(self.node_ids)
+
+    def merge(self, remove_ids: Iterable[str], added: "BM25Index") -> "BM25Index":
+        """New index without the chunks in remove_ids, followed by the chunks of added."""
+        remove_ids = set(remove_ids)
+        keep = np.asarray([node_id not in remove_ids for node_id in self.node_ids], dtype=bool)
+        renumbered = np.cumsum(keep) - 1
+
+        # Every posting as (term, doc, tf): the kept old ones renumbered, then the new ones after them
+        old_terms = np.repeat(np.arange(len(self.vocabulary)), np.diff(self.offsets))
+        old_docs = np.asarray(self.doc_indices)
+        kept_postings = keep[old_docs] if len(old_docs) else np.zeros(0, dtype=bool)
+        vocabulary = sorted(set(self.vocabulary) | set(added.vocabulary))
+        term_ids = {term: i for i, term in enumerate(vocabulary)}
+        old_to_new = np.asarray([term_ids[term] for term in self.vocabulary], dtype=np.int64)
+        added_to_new = np.asarray([term_ids[term] for term in added.vocabulary], dtype=np.int64)
+        terms = np.concatenate([
+            old_to_new[old_terms[kept_postings]] if len(old_to_new) else np.zeros(0, dtype=np.int64),
+            added_to_new[np.repeat(np.arange(len(added.vocabulary)), np.diff(added.offsets))]
+            if len(added_to_new) else np.zeros(0, dtype=np.int64)
+        ])
+        docs = np.concatenate([renumbered[old_docs[kept_postings]], np.asarray(added.doc_indices) + int(keep.sum())])
+        freqs = np.concatenate([np.asarray(self.term_freqs)[kept_postings], added.term_freqs])
+        # Stable, so each term's postings stay in document order
+        order = np.argsort(terms, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(terms, minlength=len(vocabulary)))]).astype(np.int64)
+
+        # Terms that only occurred in removed chunks are dropped from the vocabulary
+        used = np.diff(offsets) > 0
+        vocabulary = [term for term, is_used in zip(vocabulary, used) if is_used]
+        offsets = np.concatenate([[0], np.cumsum(np.diff(offsets)[used])]).astype(np.int64)
+        return BM25Index(
+            vocabulary, offsets, docs[order].astype(np.int32), freqs[order].astype(np.float32),
+            np.concatenate([np.asarray(self.doc_lengths)[keep], added.doc_lengths]).astype(np.float32),
+            [node_id for node_id, kept in zip(self.node_ids, keep) if kept] + added.node_ids,
+            [metadata for metadata, kept in zip(self.metadatas, keep) if kept] + added.metadatas,
+            self.k1, self.b
+        )
+
+    def save(self, path: str) -> None:
+        """
+        Write every file under a temporary name and rename it into place, so running
+        workers keep reading their (memory-mapped) old copy instead of a truncated file.
+        docs.json goes last because its mtime is what triggers a reload.
+        """
+        directory = Path(path)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in POSTING_ARRAYS:
+            with open(directory / f"{name}.npy.tmp", "wb") as f:
+                np.save(f, getattr(self, name))
+            os.replace(directory / f"{name}.npy.tmp", directory / f"{name}.npy")
+        with open(directory / "docs.json.tmp", "w", encoding="utf-8") as f:
+            json.dump({"vocabulary": self.vocabulary, "node_ids": self.node_ids,
+                       "metadatas": self.metadatas}, f, ensure_ascii=False)
+        os.replace(directory / "docs.json.tmp", directory / "docs.json")
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        directory = Path(path)
+        arrays = {name: np.load(directory / f"{name}.npy", mmap_mode="r") for name in POSTING_ARRAYS}
+        with open(directory / "docs.json", encoding="utf-8") as f:
+            docs = json.load(f)
+        return cls(docs["vocabulary"], arrays["offsets"], arrays["doc_indices"], arrays["term_freqs"],
+                   arrays["doc_lengths"], docs["node_ids"], docs["metadatas"])
+
+    @staticmethod
+    def mtime(path: str) -> Optional[float]:
+        """
+        Modification time of a saved index, or None if there is none. A directory without
+        the posting arrays (an older layout) counts as none, so ingest.py rebuilds it.
+        """
+        try:
+            os.stat(Path(path) / "offsets.npy")
+            return os.stat(Path(path) / "docs.json").st_mtime
+        except FileNotFoundError:
+            return None
+
+    def search(self, query: str, top_k: int,
+               metadata_filter: Optional[Callable[[Dict[str, Any]], bool]] = None) -> List[Tuple[str, float]]:
+        """Return up to top_k (node_id, bm25_score) pairs, best first."""
+        n_docs = len(self.node_ids)
+        scores = np.zeros(n_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.term_ids.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs = self.doc_indices[start:end]
+            tf = self.term_freqs[start:end]
+            idf = np.log(1.0 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * self.doc_lengths[docs] / self.avg_doc_length)
+            scores[docs] += idf * tf * (self.k1 + 1.0) / (tf + norm)
+
+        candidates = np.flatnonzero(scores)
+        if metadata_filter is not None:
+            candidates = np.asarray([i for i in candidates if metadata_filter(self.metadatas[i])], dtype=np.int64)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(self.node_ids[i], float(scores[i])) for i in ranked]
+
+
+class BM25Builder:
+    """
+    Collects chunks one at a time for BM25Index, so ingest.py can tokenize each batch of chunks
+    and let go of the texts. Postings accumulate in flat typed arrays (12 bytes each) rather
+    than per-posting Python objects.
+    """
+
+    def __init__(self):
+        self.term_ids: Dict[str, int] = {}
+        self.terms = array("i")
+        self.docs = array("i")
+        self.freqs = array("f")
+        self.doc_lengths = array("f")
+        self.node_ids: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+
+    def __len__(self) -> int:
+        return len(self.node_ids)
+
+    def add(self, node_id: str, text: str, metadata: Dict[str, Any]) -> None:
+        counts = Counter(tokenize(text))
+        doc_index = len(self.node_ids)
+        for term, tf in counts.items():
+            self.terms.append(self.term_ids.setdefault(term, len(self.term_ids)))
+            self.docs.append(doc_index)
+            self.freqs.append(tf)
+        self.node_ids.append(node_id)
+        self.metadatas.append(metadata)
+        self.doc_lengths.append(sum(counts.values()))
+
+    def build(self) -> BM25Index:
+        vocabulary = sorted(self.term_ids)
+        sorted_ids = np.empty(len(vocabulary), dtype=np.int64)
+        sorted_ids[[self.term_ids[term] for term in vocabulary]] = np.arange(len(vocabulary))
+        terms = sorted_ids[np.frombuffer(self.terms, dtype=np.int32)] if len(self.terms) else np.zeros(0, dtype=np.int64)
+        # Stable, so each term's postings stay in document order
+        order = np.argsort(terms, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(terms, minlength=len(vocabulary)))]).astype(np.int64)
+        return BM25Index(vocabulary, offsets, np.frombuffer(self.docs, dtype=np.int32)[order].astype(np.int32),
+                         np.frombuffer(self.freqs, dtype=np.float32)[order].astype(np.float32),
+                         np.frombuffer(self.doc_lengths, dtype=np.float32).copy(), self.node_ids, self.metadatas)
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse several ranked id lists: score(id) = sum over lists of 1 / (k + rank)."""
+    fused = defaultdict(float)
+    for ranking in rankings:
+        for rank, node_id in enumerate(ranking, start=1):
+            fused[node_id] += 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
@@ -1,40 +1,252 @@
 import os
+import math
+import json
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
-from typing import List, Dict, Any
-import chromadb
+from functools import partial
+from typing import List, Dict, Any, Optional, Tuple, Literal, Union
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse, Response, JSONResponse
 from pydantic import BaseModel
-from llama_index.core import VectorStoreIndex, Settings
+from prometheus_client import CONTENT_TYPE_LATEST
+from llama_index.core import VectorStoreIndex, Settings, get_response_synthesizer
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle, TextNode
+from llama_index.core.prompts.default_prompts import DEFAULT_TEXT_QA_PROMPT_TMPL
+from llama_index.core.vector_stores.types import MetadataFilter, MetadataFilters, FilterOperator
+from llama_index.core.vector_stores.utils import metadata_dict_to_node
 from llama_index.vector_stores.chroma import ChromaVectorStore
-from llama_index.llms.ollama.base import Ollama as OllamaLLM
-from llama_index.embeddings.ollama import OllamaEmbedding
+from numpy_store import NumpyVectorStore
 from llama_index.core.storage import StorageContext
+from cache import SemanticAnswerCache, CachedAnswer, QueryEmbeddingCache, CachedOllamaEmbedding, normalize_question
+from lexical import BM25Index, reciprocal_rank_fusion
+from context import count_tokens, pack_context
+from admission import AdmissionController, AdmissionRejected
+from singleflight import SingleFlight, Broadcast
+from sessions import SessionStore, Session
+from metrics import (
+    InstrumentedOllama, RequestMetricsMiddleware,
+    observe_stage, observe_synthesis, register_cache_stats, register_pool_stats, render_metrics, mark_worker_exited, record_token_usage
+)
+from http_pool import (
+    OLLAMA_LIMITS, OLLAMA_REQUEST_TIMEOUT, ollama_async_transport, ollama_async_client,
+    open_chroma_client, chroma_location, pool_stats, chroma_pool_stats
+)
 
 # Configuration
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://host.docker.internal:11434")
 CHROMA_HOST = os.getenv("CHROMA_HOST", "localhost")
 CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8000")) # FIXED: Matched to standard 8000 port
+# "http" uses the chroma container; "embedded" opens a persistent store in-process at CHROMA_PERSIST_PATH
+CHROMA_MODE = os.getenv("CHROMA_MODE", "http")
+CHROMA_PERSIST_PATH = os.getenv("CHROMA_PERSIST_PATH", "./chroma_store")
+# "chroma" or "numpy" (exact search over a memory-mapped matrix at NUMPY_STORE_PATH, written by ingest.py)
+VECTOR_STORE = os.getenv("VECTOR_STORE", "chroma")
+NUMPY_STORE_PATH = os.getenv("NUMPY_STORE_PATH", "./index/vectors")
+# For a quantized store: candidates re-scored against the float32 vectors per result (0 = no re-scoring)
+NUMPY_STORE_RESCORE_FACTOR = int(os.getenv("NUMPY_STORE_RESCORE_FACTOR", "4"))
+# IVF lists searched per query when ingest.py built an ANN index (0 = always search exhaustively)
+NUMPY_STORE_NPROBE = int(os.getenv("NUMPY_STORE_NPROBE", "8"))
+SIMILARITY_TOP_K = int(os.getenv("SIMILARITY_TOP_K", "3"))
+RETRIEVE_MAX_TOP_K = int(os.getenv("RETRIEVE_MAX_TOP_K", "50"))
+# Retrieval mode: "vector" (Chroma only), "hybrid" (BM25 + vector, fused with RRF) or "lexical" (BM25 only)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "vector")
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", "./index/bm25") # Written by ingest.py
+RRF_K = int(os.getenv("RRF_K", "60"))
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20")) # Per-retriever depth before fusion
+# In hybrid mode a query embedding slower than this falls back to lexical-only results
+EMBED_TIMEOUT_SECONDS = float(os.getenv("EMBED_TIMEOUT_SECONDS", "5"))
+# Worker threads for the calls that are still synchronous (Chroma HTTP client, index setup)
+QUERY_EXECUTOR_WORKERS = int(os.getenv("QUERY_EXECUTOR_WORKERS", "8"))
+# Semantic answer cache: near-identical questions skip retrieval and generation
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+ANSWER_CACHE_MAX_MB = int(os.getenv("ANSWER_CACHE_MAX_MB", "64"))
+# How often to re-read the collection's index_version (written by ingest.py)
+INDEX_VERSION_CHECK_SECONDS = float(os.getenv("INDEX_VERSION_CHECK_SECONDS", "30"))
+# Exact-match query embedding cache; set QUERY_EMBED_CACHE_PATH to share it on disk
+QUERY_EMBED_CACHE_SIZE = int(os.getenv("QUERY_EMBED_CACHE_SIZE", "4096"))
+QUERY_EMBED_CACHE_PATH = os.getenv("QUERY_EMBED_CACHE_PATH", "")
+QUERY_EMBED_CACHE_MAX_MB = float(os.getenv("QUERY_EMBED_CACHE_MAX_MB", "64")) # Vectors kept in that file; least recently used go first
+# /query/batch limits
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "64"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+# Prompt tokens available for retrieved passages (the model's context_window is 4096;
+# the rest is left for the system prompt, the template, the question and the answer)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2500"))
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.9")) # Word 3-gram Jaccard
+# Startup warmup: connect to Chroma, build the index and load both Ollama models before /ready reports ready
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "600")) # Give up (and stay unready) after this
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "5"))
+# How long Ollama keeps the models loaded after a request; a negative number pins them in memory
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "-1")
+# Admission control: at most ADMISSION_MAX_CONCURRENT requests generate at once, the rest queue
+# per priority; a full queue or a wait beyond ADMISSION_MAX_WAIT_SECONDS is answered with 429
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "2")) # Match OLLAMA_NUM_PARALLEL on the Ollama host
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "16")) # Per priority class
+ADMISSION_MAX_WAIT_SECONDS = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "60"))
+# Identical questions arriving while one is being answered share that answer (and its token stream)
+COALESCE_REQUESTS = os.getenv("COALESCE_REQUESTS", "true").lower() == "true"
+# Conversation sessions (/sessions): held in memory per worker, least recently used evicted first
+SESSIONS_MAX = int(os.getenv("SESSIONS_MAX", "1000"))
+SESSIONS_MAX_MB = int(os.getenv("SESSIONS_MAX_MB", "64"))
+SESSION_IDLE_SECONDS = float(os.getenv("SESSION_IDLE_SECONDS", "1800"))
+# Passages per session turn get a smaller budget than CONTEXT_TOKEN_BUDGET, so earlier turns fit alongside them
+SESSION_CONTEXT_TOKEN_BUDGET = int(os.getenv("SESSION_CONTEXT_TOKEN_BUDGET", "1000"))
+# Tokens kept free for the answer; a turn that would not fit in the model's context_window with
+# them starts a fresh Ollama context, seeded with a recap of the last turns
+SESSION_ANSWER_RESERVE_TOKENS = int(os.getenv("SESSION_ANSWER_RESERVE_TOKENS", "768"))
+SESSION_RECAP_TURNS = int(os.getenv("SESSION_RECAP_TURNS", "3"))
 
 chroma_client = None
 index = None
+index_mtime = None
+executor = None
+answer_cache = None
+index_version_checked_at = 0.0
+lexical_index = None
+lexical_index_mtime = None
+ollama_transport = None
+query_embedding_cache = None
+session_store = None
+in_flight = SingleFlight()
+admission = AdmissionController(
+    max_concurrent=ADMISSION_MAX_CONCURRENT,
+    max_queue=ADMISSION_MAX_QUEUE,
+    max_wait_seconds=ADMISSION_MAX_WAIT_SECONDS
+) if ADMISSION_ENABLED else None
+warmup_task = None
+readiness = {"status": "starting", "steps": {}, "error": None}
+index_lock = threading.Lock()
+lexical_index_lock = threading.Lock()
+
+def reset_after_fork():
+    """
+    Workers forked from a parent that already imported (or used) this module, e.g.
+    gunicorn --preload, must not share its Chroma connection or a lock held at fork
+    time: drop them so every worker builds its own clients and pools.
+    """
+    global chroma_client, index, index_mtime, lexical_index, lexical_index_mtime, index_lock, lexical_index_lock
+    chroma_client = None
+    index = None
+    index_mtime = None
+    lexical_index = None
+    lexical_index_mtime = None
+    index_lock = threading.Lock()
+    lexical_index_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=reset_after_fork)
+
+# Read at scrape time, so the collector always sees the current cache objects
+register_cache_stats({
+    "answer": lambda: answer_cache.stats() if answer_cache is not None else None,
+    "query_embedding": lambda: query_embedding_cache.stats() if query_embedding_cache is not None else None
+})
+register_pool_stats({
+    "ollama": lambda: pool_stats(ollama_transport, OLLAMA_LIMITS),
+    "chroma": lambda: chroma_pool_stats(chroma_client)
+})
+
+def parse_keep_alive(value: str):
+    """Ollama accepts a number of seconds or a duration string such as "30m"."""
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+async def warmup_step(name: str, func, deadline: float):
+    """Run one warmup step, retrying while Chroma or Ollama are still starting up."""
+    started = time.perf_counter()
+    while True:
+        try:
+            result = await func()
+            readiness["steps"][name] = round((time.perf_counter() - started) * 1000, 1)
+            return result
+        except Exception as e:
+            if time.monotonic() + WARMUP_RETRY_SECONDS > deadline:
+                raise RuntimeError(f"{name}: {e}") from e
+            print(f"Warmup: {name} not ready yet ({e}); retrying in {WARMUP_RETRY_SECONDS:g}s")
+            await asyncio.sleep(WARMUP_RETRY_SECONDS)
+
+async def warm_up():
+    """
+    Pay every cold-start cost before traffic arrives: the Chroma connection and index,
+    the lexical index, the first vector search, and loading nomic-embed-text and gpt-oss:20b.
+    """
+    readiness["status"] = "warming_up"
+    deadline = time.monotonic() + WARMUP_TIMEOUT_SECONDS
+    started = time.perf_counter()
+    try:
+        current_index = await warmup_step("chroma_index", lambda: run_sync(get_index), deadline)
+        await warmup_step("lexical_index", lambda: run_sync(get_lexical_index), deadline)
+        embedding = await warmup_step(
+            "embedding_model", lambda: Settings.embed_model.aget_text_embedding("warmup"), deadline
+        )
+        retriever = current_index.as_retriever(similarity_top_k=1)
+        await warmup_step(
+            "vector_search", lambda: run_sync(retriever.retrieve, QueryBundle("warmup", embedding=embedding)), deadline
+        )
+        llm = Settings.llm
+        if isinstance(llm, InstrumentedOllama):
+            # An empty prompt only loads the model; keep_alive pins it for the following requests
+            await warmup_step("llm", lambda: llm.async_client.generate(
+                model=llm.model, prompt="", keep_alive=llm.keep_alive
+            ), deadline)
+        readiness["status"] = "ready"
+        print(f"Warmup finished in {time.perf_counter() - started:.1f}s: {readiness['steps']}")
+    except Exception as e:
+        readiness["status"] = "failed"
+        readiness["error"] = str(e)
+        print(f"Warning: Warmup failed, /ready will keep returning 503: {e}")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global chroma_client, index
+    global chroma_client, executor, answer_cache, ollama_transport, query_embedding_cache, warmup_task, session_store
     
-    print(f"Initializing ChromaDB connection at {CHROMA_HOST}:{CHROMA_PORT}...")
-    try:
-        chroma_client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
-        print("Connected to ChromaDB")
-    except Exception as e:
-        print(f"Warning: Could not connect to ChromaDB: {e}")
-        print("The API will attempt to connect on first query")
+    executor = ThreadPoolExecutor(max_workers=QUERY_EXECUTOR_WORKERS, thread_name_prefix="nalanda-query")
+    session_store = SessionStore(
+        max_sessions=SESSIONS_MAX,
+        max_bytes=SESSIONS_MAX_MB * 1024 * 1024,
+        idle_seconds=SESSION_IDLE_SECONDS
+    )
+    if ANSWER_CACHE_ENABLED:
+        answer_cache = SemanticAnswerCache(
+            threshold=ANSWER_CACHE_THRESHOLD,
+            ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+            max_entries=ANSWER_CACHE_MAX_ENTRIES,
+            max_bytes=ANSWER_CACHE_MAX_MB * 1024 * 1024
+        )
+    
+    if VECTOR_STORE == "numpy":
+        # Memory-mapped read-only, so any number of workers share one copy of the vectors
+        print(f"Using the NumPy vector store at {NUMPY_STORE_PATH}")
+    else:
+        print(f"Initializing ChromaDB connection to {chroma_location(CHROMA_MODE, CHROMA_HOST, CHROMA_PORT, CHROMA_PERSIST_PATH)}...")
+        try:
+            chroma_client = open_chroma_client(CHROMA_MODE, CHROMA_HOST, CHROMA_PORT, CHROMA_PERSIST_PATH)
+            print("Connected to ChromaDB")
+            if CHROMA_MODE == "embedded" and int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+                print("Warning: Embedded Chroma is not safe to open from several workers; set WEB_CONCURRENCY=1")
+        except Exception as e:
+            print(f"Warning: Could not connect to ChromaDB: {e}")
+            print("The API will attempt to connect on first query")
+    
+    # One keep-alive connection pool shared by the LLM and embedding clients
+    ollama_transport = ollama_async_transport()
     
     print(f"Initializing Ollama LLM from {OLLAMA_BASE_URL}...")
-    llm = OllamaLLM(
+    llm = InstrumentedOllama(
         model="gpt-oss:20b", # FIXED: Corrected spelling
         base_url=OLLAMA_BASE_URL,
-        request_timeout=300.0,
+        request_timeout=OLLAMA_REQUEST_TIMEOUT,
+        async_client=ollama_async_client(OLLAMA_BASE_URL, ollama_transport),
+        keep_alive=parse_keep_alive(OLLAMA_KEEP_ALIVE),
         temperature=0.1, # LOWERED: 0.1 prevents the AI from "hallucinating" fake scripture
         context_window=4096,
         system_prompt=(
@@ -47,18 +259,37 @@ async def lifespan(app: FastAPI):
     )
     
     print(f"Initializing Ollama embeddings from {OLLAMA_BASE_URL}...")
-    embed_model = OllamaEmbedding(
+    query_embedding_cache = QueryEmbeddingCache(
+        max_entries=QUERY_EMBED_CACHE_SIZE,
+        db_path=QUERY_EMBED_CACHE_PATH or None,
+        max_db_bytes=int(QUERY_EMBED_CACHE_MAX_MB * 1024 * 1024)
+    )
+    embed_model = CachedOllamaEmbedding(
+        query_cache=query_embedding_cache,
         model_name="nomic-embed-text",
-        base_url=OLLAMA_BASE_URL
+        base_url=OLLAMA_BASE_URL,
+        keep_alive=parse_keep_alive(OLLAMA_KEEP_ALIVE),
+        async_client=ollama_async_client(OLLAMA_BASE_URL, ollama_transport)
     )
     
     # Set LlamaIndex globals
     Settings.llm = llm
     Settings.embed_model = embed_model
     
+    if WARMUP_ON_STARTUP:
+        # Runs in the background so /health and /ready answer while the models load
+        warmup_task = asyncio.create_task(warm_up())
+    else:
+        readiness["status"] = "ready"
+    
     yield
     
     print("Shutting down Digital Nalanda API")
+    if warmup_task is not None:
+        warmup_task.cancel()
+    executor.shutdown(wait=False, cancel_futures=True)
+    await ollama_transport.aclose()
+    mark_worker_exited()
 
 
 app = FastAPI(
@@ -67,40 +298,385 @@ app = FastAPI(
     version="1.0.0",
     lifespan=lifespan
 )
+app.add_middleware(RequestMetricsMiddleware, paths=["/query", "/query/stream", "/query/batch", "/retrieve"])
+
+RetrievalMode = Literal["vector", "hybrid", "lexical"]
+# Interactive requests are always admitted before queued batch work
+Priority = Literal["interactive", "batch"]
 
 class QueryRequest(BaseModel):
     question: str
+    mode: Optional[RetrievalMode] = None
+    # Metadata filters pushed into the Chroma where clause, e.g. {"building": "ratnasagara", "domain": "cikitsavidya"}
+    filters: Optional[Dict[str, Any]] = None
+    priority: Priority = "interactive"
 
 class QueryResponse(BaseModel):
     answer: str
     sources: List[Dict[str, Any]]
+    cached: bool = False
+
+class RetrieveRequest(BaseModel):
+    question: str
+    top_k: int = SIMILARITY_TOP_K
+    full_text: bool = False
+    max_chars: int = 200
+    # Exact-match metadata filters, e.g. {"domain": "shruti"} or {"work": "The Laws of Manu"}; a list value matches any of its items
+    filters: Optional[Dict[str, Any]] = None
+    mode: Optional[RetrievalMode] = None
+
+class RetrieveResponse(BaseModel):
+    sources: List[Dict[str, Any]]
+    retrieval_ms: float
+
+class BatchQuestion(BaseModel):
+    question: str
+    # Override the batch-wide mode / filters for this question
+    mode: Optional[RetrievalMode] = None
+    filters: Optional[Dict[str, Any]] = None
+
+class BatchQueryRequest(BaseModel):
+    questions: List[Union[str, BatchQuestion]]
+    concurrency: Optional[int] = None
+    priority: Priority = "batch"
+    mode: Optional[RetrievalMode] = None
+    filters: Optional[Dict[str, Any]] = None
+
+class BatchItemResult(BaseModel):
+    question: str
+    answer: Optional[str] = None
+    sources: List[Dict[str, Any]] = []
+    cached: bool = False
+    error: Optional[str] = None
+
+class BatchQueryResponse(BaseModel):
+    results: List[BatchItemResult]
+
+class SessionInfo(BaseModel):
+    session_id: str
+    turns: int = 0
+    context_tokens: int = 0
+
+class SessionQueryRequest(BaseModel):
+    question: str
+    mode: Optional[RetrievalMode] = None
+    filters: Optional[Dict[str, Any]] = None
+    priority: Priority = "interactive"
+
+class SessionQueryResponse(BaseModel):
+    session_id: str
+    turn: int
+    answer: str
+    sources: List[Dict[str, Any]]
+    # Tokens Ollama had to prefill for this turn, and the size of the context carried to the next one
+    prompt_tokens: int
+    context_tokens: int
+
+def index_is_current() -> bool:
+    """False before the first load and, for the NumPy store, after ingest.py has written a new generation."""
+    if index is None:
+        return False
+    return VECTOR_STORE != "numpy" or NumpyVectorStore.mtime(NUMPY_STORE_PATH) == index_mtime
 
 def get_index():
     """Get or create the VectorStoreIndex."""
-    global chroma_client, index
+    global chroma_client, index, index_mtime
     
-    if index is not None:
+    if index_is_current():
         return index
-        
-    if chroma_client is None:
+
+    # Executor threads (and warmup) may race here on the first requests; only one builds the index
+    with index_lock:
+        if index_is_current():
+            return index
+
+        if VECTOR_STORE == "numpy":
+            mtime = NumpyVectorStore.mtime(NUMPY_STORE_PATH)
+            if mtime is None:
+                raise HTTPException(status_code=503, detail=f"No vector store at {NUMPY_STORE_PATH}; run ingest.py to build it")
+            vector_store = NumpyVectorStore(NUMPY_STORE_PATH, rescore_factor=NUMPY_STORE_RESCORE_FACTOR,
+                                            nprobe=NUMPY_STORE_NPROBE)
+            index = VectorStoreIndex.from_vector_store(vector_store=vector_store)
+            index_mtime = mtime
+            print(f"Loaded NumPy vector store with {vector_store.count} chunks "
+                  f"({vector_store.quantization} quantization) from {NUMPY_STORE_PATH}")
+            return index
+
+        if chroma_client is None:
+            try:
+                chroma_client = open_chroma_client(CHROMA_MODE, CHROMA_HOST, CHROMA_PORT, CHROMA_PERSIST_PATH)
+            except Exception as e:
+                raise HTTPException(status_code=503, detail=f"Cannot connect to ChromaDB: {e}")
+
         try:
-            chroma_client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
+            # FIXED: Collection name now exactly matches ingest.py
+            vector_store = ChromaVectorStore(
+                chroma_collection=chroma_client.get_or_create_collection("digital_nalanda")
+            )
+            storage_context = StorageContext.from_defaults(vector_store=vector_store)
+            index = VectorStoreIndex.from_vector_store(
+                vector_store=vector_store,
+                storage_context=storage_context
+            )
+            return index
         except Exception as e:
-            raise HTTPException(status_code=503, detail=f"Cannot connect to ChromaDB: {e}")
-            
+            raise HTTPException(status_code=500, detail=f"Error initializing index: {e}")
+
+async def run_sync(func, *args, **kwargs):
+    """Run a blocking call on the bounded query executor so the event loop stays free."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(func, *args, **kwargs))
+
+def build_metadata_filters(filters: Optional[Dict[str, Any]]) -> Optional[MetadataFilters]:
+    """Turn {"key": value} / {"key": [values]} into LlamaIndex filters that Chroma applies in its where clause."""
+    if not filters:
+        return None
+    return MetadataFilters(filters=[
+        MetadataFilter(key=key, value=value, operator=FilterOperator.IN)
+        if isinstance(value, list) else MetadataFilter(key=key, value=value)
+        for key, value in filters.items()
+    ])
+
+def matches_filters(metadata: Dict[str, Any], filters: Dict[str, Any]) -> bool:
+    """Python equivalent of build_metadata_filters, for results that do not come from Chroma."""
+    return all(
+        metadata.get(key) in value if isinstance(value, list) else metadata.get(key) == value
+        for key, value in filters.items()
+    )
+
+def get_lexical_index() -> Optional[BM25Index]:
+    """Load the BM25 index written by ingest.py, reloading it whenever ingest rewrites it."""
+    global lexical_index, lexical_index_mtime
+    mtime = BM25Index.mtime(LEXICAL_INDEX_PATH)
+    if mtime is None:
+        return None
+    if mtime != lexical_index_mtime:
+        with lexical_index_lock:
+            if mtime != lexical_index_mtime:
+                lexical_index = BM25Index.load(LEXICAL_INDEX_PATH)
+                lexical_index_mtime = mtime
+                print(f"Loaded lexical index with {len(lexical_index)} chunks from {LEXICAL_INDEX_PATH}")
+    return lexical_index
+
+def search_lexical(question: str, top_k: int, filters: Optional[Dict[str, Any]] = None) -> Optional[List[Tuple[str, float]]]:
+    """BM25 search; None when no lexical index has been built yet."""
+    current_lexical_index = get_lexical_index()
+    if current_lexical_index is None:
+        return None
+    metadata_filter = (lambda metadata: matches_filters(metadata, filters)) if filters else None
+    return current_lexical_index.search(question, top_k, metadata_filter)
+
+def chroma_record_to_node(node_id: str, text: Optional[str], metadata: Optional[Dict[str, Any]]) -> TextNode:
     try:
-        # FIXED: Collection name now exactly matches ingest.py
-        vector_store = ChromaVectorStore(
-            chroma_collection=chroma_client.get_or_create_collection("digital_nalanda")
-        )
-        storage_context = StorageContext.from_defaults(vector_store=vector_store)
-        index = VectorStoreIndex.from_vector_store(
-            vector_store=vector_store,
-            storage_context=storage_context
-        )
-        return index
+        return metadata_dict_to_node(metadata, text=text)
+    except Exception:
+        return TextNode(text=text or "", id_=node_id, metadata=metadata or {})
+
+def fetch_nodes(node_ids: List[str]) -> Dict[str, TextNode]:
+    """Load chunks from the vector store by id (used for lexical hits, which carry no text)."""
+    if not node_ids:
+        return {}
+    vector_store = get_index().vector_store
+    if isinstance(vector_store, NumpyVectorStore):
+        return {node.node_id: node for node in vector_store.get_nodes(node_ids=node_ids)}
+    collection = vector_store.client
+    results = collection.get(ids=node_ids, include=["documents", "metadatas"])
+    return {
+        node_id: chroma_record_to_node(node_id, text, metadata)
+        for node_id, text, metadata in zip(results["ids"], results["documents"], results["metadatas"])
+    }
+
+async def embed_question(question: str, mode: str) -> Optional[List[float]]:
+    """
+    Embed the question for vector search. In lexical mode nothing is embedded; in hybrid
+    mode a slow or failing Ollama returns None so retrieval can fall back to BM25 alone.
+    """
+    if mode == "lexical":
+        return None
+    if mode == "hybrid":
+        try:
+            with observe_stage("embed", upstream="ollama"):
+                return await asyncio.wait_for(Settings.embed_model.aget_query_embedding(question), EMBED_TIMEOUT_SECONDS)
+        except Exception as e:
+            print(f"Warning: Query embedding unavailable ({e!r}); using lexical results only")
+            return None
+    with observe_stage("embed", upstream="ollama"):
+        return await Settings.embed_model.aget_query_embedding(question)
+
+async def retrieve_nodes(question: str, top_k: int = SIMILARITY_TOP_K,
+                         query_embedding: Optional[List[float]] = None,
+                         filters: Optional[Dict[str, Any]] = None,
+                         mode: Optional[str] = None, embed: bool = True) -> List[NodeWithScore]:
+    """
+    Retrieve the top_k chunks for a question. Vector search embeds the question
+    asynchronously and searches Chroma off the event loop; hybrid mode also runs
+    BM25 and fuses both rankings with reciprocal rank fusion. embed=False means the
+    caller already tried to embed it: without query_embedding, only BM25 is used.
+    """
+    mode = mode or RETRIEVAL_MODE
+    with observe_stage("index_setup", upstream="chroma"):
+        current_index = await run_sync(get_index)
+
+    lexical_hits = None
+    if mode in ("hybrid", "lexical"):
+        with observe_stage("lexical_search"):
+            lexical_hits = await run_sync(search_lexical, question, max(top_k, HYBRID_CANDIDATES), filters)
+        if lexical_hits is None:
+            if mode == "lexical":
+                raise HTTPException(status_code=503, detail="Lexical index not found; run ingest.py to build it")
+            print(f"Warning: No lexical index at {LEXICAL_INDEX_PATH}; using vector search only")
+            mode = "vector"
+
+    # Without a lexical index there is nothing to fall back to, so embedding is worth another try
+    if query_embedding is None and (embed or lexical_hits is None):
+        query_embedding = await embed_question(question, mode)
+    vector_nodes = []
+    if query_embedding is not None:
+        depth = top_k if mode == "vector" else max(top_k, HYBRID_CANDIDATES)
+        retriever = current_index.as_retriever(similarity_top_k=depth, filters=build_metadata_filters(filters))
+        # ChromaVectorStore has no native async query, so the search runs on the executor
+        with observe_stage("vector_search", upstream="chroma"):
+            vector_nodes = await run_sync(retriever.retrieve, QueryBundle(question, embedding=query_embedding))
+    if lexical_hits is None:
+        return vector_nodes
+
+    if vector_nodes:
+        fused = reciprocal_rank_fusion(
+            [[node.node.node_id for node in vector_nodes], [node_id for node_id, _ in lexical_hits]], k=RRF_K
+        )[:top_k]
+    else:
+        fused = lexical_hits[:top_k] # Lexical-only: keep the BM25 scores
+    known = {node.node.node_id: node.node for node in vector_nodes}
+    with observe_stage("fetch_nodes", upstream="chroma"):
+        known.update(await run_sync(fetch_nodes, [node_id for node_id, _ in fused if node_id not in known]))
+    return [NodeWithScore(node=known[node_id], score=score) for node_id, score in fused if node_id in known]
+
+async def embed_questions(questions: List[str]) -> List[List[float]]:
+    """Embed many questions, batched into one Ollama request where the model supports it."""
+    embed_model = Settings.embed_model
+    with observe_stage("embed", upstream="ollama"):
+        if isinstance(embed_model, CachedOllamaEmbedding):
+            return await embed_model.aget_query_embedding_batch(questions)
+        return list(await asyncio.gather(*(embed_model.aget_query_embedding(q) for q in questions)))
+
+def search_batch(query_embeddings: List[List[float]], top_k: int = SIMILARITY_TOP_K) -> List[List[NodeWithScore]]:
+    """Run several similarity searches as a single multi-query Chroma request (or one matrix product)."""
+    vector_store = get_index().vector_store
+    if isinstance(vector_store, NumpyVectorStore):
+        return [
+            [NodeWithScore(node=node, score=score) for node, score in zip(result.nodes, result.similarities)]
+            for result in vector_store.query_batch(query_embeddings, top_k)
+        ]
+    collection = vector_store.client
+    results = collection.query(query_embeddings=query_embeddings, n_results=top_k)
+    batches = []
+    for ids, texts, metadatas, distances in zip(
+        results["ids"], results["documents"], results["metadatas"], results["distances"]
+    ):
+        nodes = []
+        for node_id, text, metadata, distance in zip(ids, texts, metadatas, distances):
+            node = chroma_record_to_node(node_id, text, metadata)
+            # Same distance-to-score mapping as ChromaVectorStore
+            nodes.append(NodeWithScore(node=node, score=math.exp(-distance)))
+        batches.append(nodes)
+    return batches
+
+def build_context(nodes: List[NodeWithScore], token_budget: Optional[int] = None) -> List[NodeWithScore]:
+    """Merge overlapping neighbours, drop near-duplicates and fit the rest into token_budget (default CONTEXT_TOKEN_BUDGET)."""
+    with observe_stage("context_packing"):
+        return pack_context(nodes, token_budget or CONTEXT_TOKEN_BUDGET, CONTEXT_DEDUP_THRESHOLD)
+
+async def synthesize_answer(question: str, nodes: List[NodeWithScore]) -> Tuple[str, List[Dict[str, Any]]]:
+    """Generate the answer for already-retrieved nodes."""
+    nodes = build_context(nodes)
+    # "compact" packs the retrieved chunks into as few async LLM calls as possible
+    synthesizer = get_response_synthesizer(response_mode="compact", use_async=True)
+    with observe_synthesis():
+        response = await synthesizer.asynthesize(question, nodes)
+    return str(response), format_sources(response.source_nodes or [])
+
+def format_sources(nodes: List[NodeWithScore], max_chars: Optional[int] = 200) -> List[Dict[str, Any]]:
+    """Package the source metadata for the frontend; max_chars=None keeps the full chunk text."""
+    sources = []
+    for node in nodes:
+        text = node.get_content()
+        source_info = {
+            "text": text if max_chars is None else text[:max_chars] + "...", # Truncate for cleaner JSON output
+            "metadata": node.metadata if hasattr(node, 'metadata') else {}
+        }
+        sources.append(source_info)
+    return sources
+
+def get_index_version() -> str:
+    """Version of the collection as stamped by ingest.py, plus its size as a fallback."""
+    current_index = get_index()
+    if isinstance(current_index.vector_store, NumpyVectorStore):
+        return f"{current_index.vector_store.index_version or 'unversioned'}:{current_index.vector_store.count}"
+    collection = chroma_client.get_collection("digital_nalanda")
+    stamp = (collection.metadata or {}).get("index_version", "unversioned")
+    return f"{stamp}:{collection.count()}"
+
+async def refresh_index_version():
+    """Invalidate the answer cache when ingest.py has changed the collection."""
+    global index_version_checked_at
+    now = time.monotonic()
+    if now - index_version_checked_at < INDEX_VERSION_CHECK_SECONDS:
+        return
+    index_version_checked_at = now
+    try:
+        version = await run_sync(get_index_version)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error initializing index: {e}")
+        print(f"Warning: Could not read index version: {e}")
+        return
+    if answer_cache.set_index_version(version):
+        print(f"Index version changed to {version}; answer cache invalidated")
+
+def cache_scope(mode: str, filters: Optional[Dict[str, Any]] = None) -> str:
+    """Answers are only reused between requests with the same retrieval mode and filters."""
+    return f"{mode}:{json.dumps(filters, sort_keys=True)}" if filters else mode
+
+def overloaded(e: AdmissionRejected) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=f"Server overloaded ({e.reason}); retry after {e.retry_after}s",
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+@asynccontextmanager
+async def admitted(priority: str):
+    """Hold a generation slot for the block; raises 429 with Retry-After when none can be granted."""
+    if admission is None:
+        yield
+        return
+    try:
+        async with admission.slot(priority):
+            yield
+    except AdmissionRejected as e:
+        raise overloaded(e)
+
+def flight_key(question: str, scope: str) -> Optional[str]:
+    """Key under which identical in-flight questions are coalesced; None when coalescing is off."""
+    return f"{scope}|{normalize_question(question)}" if COALESCE_REQUESTS else None
+
+async def lookup_cached_answer(question: str, scope: str,
+                               mode: str) -> Tuple[Optional[CachedAnswer], Optional[List[float]], bool]:
+    """
+    Check the answer cache. Exact repeats are answered without touching Ollama;
+    otherwise the question is embedded once and that embedding is returned for reuse.
+    The flag says whether embedding was attempted, so a hybrid query whose embedding
+    timed out goes straight to BM25 instead of waiting for Ollama a second time.
+    """
+    if answer_cache is None:
+        return None, None, False
+    await refresh_index_version()
+    cached = answer_cache.get_exact(question, scope=scope, count_miss=False)
+    if cached is not None:
+        return cached, None, False
+    query_embedding = await embed_question(question, mode)
+    if query_embedding is None:
+        answer_cache.record_miss()
+        return None, None, True
+    return answer_cache.get_similar(query_embedding, scope=scope), query_embedding, True
 
 @app.get("/health")
 async def health_check():
@@ -110,43 +686,363 @@ async def health_check():
         "service": "Digital Nalanda RAG API",
         "ollama_base_url": OLLAMA_BASE_URL,
         "chroma_host": CHROMA_HOST,
-        "chroma_port": CHROMA_PORT
+        "chroma_port": CHROMA_PORT,
+        "chroma_mode": CHROMA_MODE,
+        "vector_store": VECTOR_STORE,
+        "answer_cache": answer_cache.stats() if answer_cache is not None else None,
+        "embedding_cache": query_embedding_cache.stats() if query_embedding_cache is not None else None,
+        "http_pools": {
+            "ollama": pool_stats(ollama_transport, OLLAMA_LIMITS),
+            "chroma": chroma_pool_stats(chroma_client)
+        },
+        "coalescing": in_flight.stats() if COALESCE_REQUESTS else None,
+        "admission": admission.stats() if admission is not None else None,
+        "sessions": session_store.stats() if session_store is not None else None
     }
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe for load balancers: 200 once warmup has finished, 503 before that or if it failed."""
+    return JSONResponse(status_code=200 if readiness["status"] == "ready" else 503, content=readiness)
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: per-stage latency histograms, token counts, cache hit ratios, errors by upstream."""
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
 @app.post("/query", response_model=QueryResponse)
 async def query_scriptures(request: QueryRequest) -> QueryResponse:
     if not request.question or not request.question.strip():
         raise HTTPException(status_code=400, detail="Question cannot be empty")
         
-    try:
-        current_index = get_index()
-        
-        # Configure the query engine
-        query_engine = current_index.as_query_engine(
-            similarity_top_k=3,
-            response_mode="compact"
-        )
-        
-        response = query_engine.query(request.question)
-        
-        # Package the source metadata for the frontend
-        sources = []
-        if hasattr(response, 'source_nodes') and response.source_nodes:
-            for node in response.source_nodes:
-                source_info = {
-                    "text": node.get_content()[:200] + "...", # Truncate for cleaner JSON output
-                    "metadata": node.metadata if hasattr(node, 'metadata') else {}
-                }
-                sources.append(source_info)
-                
+    mode = request.mode or RETRIEVAL_MODE
+    scope = cache_scope(mode, request.filters)
+
+    async def answer_question() -> QueryResponse:
+        cached, query_embedding, embedded = await lookup_cached_answer(request.question, scope, mode)
+        if cached is not None:
+            return QueryResponse(answer=cached.answer, sources=cached.sources, cached=True)
+
+        async with admitted(request.priority):
+            nodes = await retrieve_nodes(request.question, query_embedding=query_embedding,
+                                         filters=request.filters, mode=mode, embed=not embedded)
+            answer, sources = await synthesize_answer(request.question, nodes)
+
+        if answer_cache is not None:
+            answer_cache.put(request.question, query_embedding, answer, sources, scope=scope)
+
         return QueryResponse(
-            answer=str(response),
+            answer=answer,
             sources=sources
         )
+
+    try:
+        key = flight_key(request.question, scope)
+        if key is None:
+            return await answer_question()
+        return await in_flight.run(key, answer_question)
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
 
+@app.post("/retrieve", response_model=RetrieveResponse)
+async def retrieve_passages(request: RetrieveRequest) -> RetrieveResponse:
+    """Return the matching passages only; the LLM is never called."""
+    if not request.question or not request.question.strip():
+        raise HTTPException(status_code=400, detail="Question cannot be empty")
+    if not 1 <= request.top_k <= RETRIEVE_MAX_TOP_K:
+        raise HTTPException(status_code=400, detail=f"top_k must be between 1 and {RETRIEVE_MAX_TOP_K}")
+    if not request.full_text and request.max_chars < 1:
+        raise HTTPException(status_code=400, detail="max_chars must be at least 1")
+
+    started = time.perf_counter()
+    try:
+        nodes = await retrieve_nodes(request.question, top_k=request.top_k, filters=request.filters, mode=request.mode)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving passages: {str(e)}")
+
+    sources = format_sources(nodes, max_chars=None if request.full_text else request.max_chars)
+    for node, source in zip(nodes, sources):
+        source["id"] = node.node.node_id
+        source["score"] = node.score
+    return RetrieveResponse(sources=sources, retrieval_ms=round((time.perf_counter() - started) * 1000, 1))
+
+@app.post("/query/batch", response_model=BatchQueryResponse)
+async def query_scriptures_batch(request: BatchQueryRequest) -> BatchQueryResponse:
+    """
+    Answer many questions at once: one batched embedding call, one multi-query
+    Chroma search, then LLM synthesis with bounded concurrency. Results (or
+    per-item errors) are returned in the order the questions were given.
+    Questions with filters or a hybrid / lexical mode are retrieved one by one,
+    as /query does.
+    """
+    if not request.questions:
+        raise HTTPException(status_code=400, detail="Questions cannot be empty")
+    if len(request.questions) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_QUESTIONS} questions per batch")
+
+    items = [item if isinstance(item, BatchQuestion) else BatchQuestion(question=item) for item in request.questions]
+    modes = [item.mode or request.mode or RETRIEVAL_MODE for item in items]
+    filters = [item.filters if item.filters is not None else request.filters for item in items]
+    scopes = [cache_scope(mode, item_filters) for mode, item_filters in zip(modes, filters)]
+    results = [BatchItemResult(question=item.question) for item in items]
+    if answer_cache is not None:
+        # Before any lookup, so answers cached against an older collection are dropped first
+        await refresh_index_version()
+    pending = []
+    for i, item in enumerate(items):
+        if not item.question or not item.question.strip():
+            results[i].error = "Question cannot be empty"
+        elif answer_cache is not None and (cached := answer_cache.get_exact(item.question, scope=scopes[i], count_miss=False)) is not None:
+            results[i].answer, results[i].sources, results[i].cached = cached.answer, cached.sources, True
+        else:
+            pending.append(i)
+    if not pending:
+        return BatchQueryResponse(results=results)
+
+    embeddings: Dict[int, List[float]] = {}
+    searched: Dict[int, List[NodeWithScore]] = {}
+    try:
+        # Vector-mode questions share one embedding call; hybrid ones embed in retrieve_nodes, with its timeout
+        to_embed = [i for i in pending if modes[i] == "vector"]
+        if to_embed:
+            for i, embedding in zip(to_embed, await embed_questions([items[i].question for i in to_embed])):
+                embeddings[i] = embedding
+
+        to_answer = []
+        for i in pending:
+            cached = None
+            if answer_cache is not None:
+                if i in embeddings:
+                    cached = answer_cache.get_similar(embeddings[i], scope=scopes[i])
+                else:
+                    answer_cache.record_miss()
+            if cached is not None:
+                results[i].answer, results[i].sources, results[i].cached = cached.answer, cached.sources, True
+            else:
+                to_answer.append(i)
+        if not to_answer:
+            return BatchQueryResponse(results=results)
+
+        # Unfiltered vector questions go out as one multi-query search
+        to_search = [i for i in to_answer if modes[i] == "vector" and not filters[i]]
+        if to_search:
+            with observe_stage("vector_search", upstream="chroma"):
+                node_batches = await run_sync(search_batch, [embeddings[i] for i in to_search])
+            searched.update(zip(to_search, node_batches))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing batch: {str(e)}")
+
+    concurrency = max(1, min(request.concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def answer_one(i: int):
+        question = items[i].question
+        async with semaphore:
+            try:
+                nodes = searched.get(i)
+                if nodes is None:
+                    nodes = await retrieve_nodes(question, query_embedding=embeddings.get(i),
+                                                 filters=filters[i], mode=modes[i])
+                async with admitted(request.priority):
+                    results[i].answer, results[i].sources = await synthesize_answer(question, nodes)
+            except HTTPException as e:
+                results[i].error = e.detail
+                return
+            except Exception as e:
+                results[i].error = f"Error processing query: {str(e)}"
+                return
+        if answer_cache is not None:
+            answer_cache.put(question, embeddings.get(i), results[i].answer, results[i].sources, scope=scopes[i])
+
+    await asyncio.gather(*(answer_one(i) for i in to_answer))
+    return BatchQueryResponse(results=results)
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format a single server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/query/stream")
+async def query_scriptures_stream(request: QueryRequest) -> StreamingResponse:
+    """
+    Stream the answer as server-sent events: one `sources` event as soon as
+    retrieval finishes, a `token` event per LLM chunk, then a `done` summary.
+    """
+    if not request.question or not request.question.strip():
+        raise HTTPException(status_code=400, detail="Question cannot be empty")
+    # Reject before the event stream starts, while a real 429 status can still be sent
+    if admission is not None and admission.saturated(request.priority):
+        raise overloaded(AdmissionRejected("queue_full", admission.retry_after()))
+
+    mode = request.mode or RETRIEVAL_MODE
+    scope = cache_scope(mode, request.filters)
+
+    async def produce_events(broadcast: Broadcast):
+        started = time.perf_counter()
+        try:
+            cached, query_embedding, embedded = await lookup_cached_answer(request.question, scope, mode)
+            if cached is not None:
+                broadcast.publish("sources", {"sources": cached.sources, "retrieval_ms": 0.0, "cached": True})
+                broadcast.publish("token", {"token": cached.answer})
+                broadcast.publish("done", {
+                    "answer": cached.answer,
+                    "cached": True,
+                    "total_ms": round((time.perf_counter() - started) * 1000, 1)
+                })
+                return
+
+            async with admitted(request.priority):
+                nodes = await retrieve_nodes(request.question, query_embedding=query_embedding,
+                                             filters=request.filters, mode=mode, embed=not embedded)
+                retrieval_ms = (time.perf_counter() - started) * 1000
+                nodes = build_context(nodes)
+                sources = format_sources(nodes)
+                broadcast.publish("sources", {"sources": sources, "retrieval_ms": round(retrieval_ms, 1)})
+
+                synthesizer = get_response_synthesizer(response_mode="compact", use_async=True, streaming=True)
+                answer = ""
+                token_count = 0
+                first_token_ms = None
+                with observe_synthesis():
+                    response = await synthesizer.asynthesize(request.question, nodes)
+                    async for token in response.async_response_gen():
+                        if first_token_ms is None:
+                            first_token_ms = (time.perf_counter() - started) * 1000
+                        answer += token
+                        token_count += 1
+                        broadcast.publish("token", {"token": token})
+
+            if answer_cache is not None:
+                answer_cache.put(request.question, query_embedding, answer, sources, scope=scope)
+
+            broadcast.publish("done", {
+                "answer": answer,
+                "token_count": token_count,
+                "retrieval_ms": round(retrieval_ms, 1),
+                "first_token_ms": round(first_token_ms, 1) if first_token_ms is not None else None,
+                "total_ms": round((time.perf_counter() - started) * 1000, 1)
+            })
+        except Exception as e:
+            # Headers are already sent, so errors are reported in-band
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            broadcast.publish("error", {"detail": f"Error processing query: {detail}"})
+
+    async def event_stream():
+        key = flight_key(request.question, scope)
+        if key is not None:
+            # Late joiners replay the events already sent, then follow the shared stream live
+            async for event, data in in_flight.stream(key, produce_events).subscribe():
+                yield sse_event(event, data)
+            return
+
+        broadcast = Broadcast()
+        producer = asyncio.ensure_future(produce_events(broadcast))
+        producer.add_done_callback(lambda _: broadcast.close())
+        try:
+            async for event, data in broadcast.subscribe():
+                yield sse_event(event, data)
+        finally:
+            # Nobody else is listening, so a client disconnect stops generation
+            producer.cancel()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def session_prompt(session: Session, question: str, nodes: List[NodeWithScore],
+                   context_window: int, system_prompt: Optional[str] = None) -> Tuple[str, bool]:
+    """
+    Prompt for one conversation turn: only the passages retrieved for this question. Returns
+    (prompt, reset): when the carried context, this prompt and SESSION_ANSWER_RESERVE_TOKENS
+    would not fit in context_window together, the context is dropped and a short recap of the
+    last turns is sent instead.
+    """
+    context_str = "\n\n".join(node.node.get_content(metadata_mode=MetadataMode.LLM) for node in nodes)
+    prompt = DEFAULT_TEXT_QA_PROMPT_TMPL.format(context_str=context_str, query_str=question)
+    # Counted with LlamaIndex's tokenizer, not the model's: an estimate, hence the reserve
+    prompt_tokens = count_tokens(prompt) + (count_tokens(system_prompt) if system_prompt else 0)
+    reset = session.context_tokens + prompt_tokens + SESSION_ANSWER_RESERVE_TOKENS > context_window
+    if reset and session.turns:
+        prompt = f"Earlier in this conversation:\n{session.recap(SESSION_RECAP_TURNS)}\n\n{prompt}"
+    return prompt, reset
+
+def get_session(session_id: str) -> Session:
+    session = session_store.get(session_id) if session_store is not None else None
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return session
+
+@app.post("/sessions", response_model=SessionInfo)
+async def create_session() -> SessionInfo:
+    """Start a conversation; pass the session_id to /sessions/{session_id}/query for each turn."""
+    return SessionInfo(session_id=session_store.create().session_id)
+
+@app.get("/sessions/{session_id}", response_model=SessionInfo)
+async def session_info(session_id: str) -> SessionInfo:
+    session = get_session(session_id)
+    return SessionInfo(session_id=session_id, turns=len(session.turns), context_tokens=session.context_tokens)
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    if not session_store.delete(session_id):
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return {"deleted": session_id}
+
+@app.post("/sessions/{session_id}/query", response_model=SessionQueryResponse)
+async def query_session(session_id: str, request: SessionQueryRequest) -> SessionQueryResponse:
+    """
+    One conversation turn. Retrieval runs for the new question only, and Ollama continues from
+    the context it returned for the previous turn (kept loaded by keep_alive), so only this
+    turn's passages and question are prefilled. Answers are never cached: they depend on the history.
+    """
+    if not request.question or not request.question.strip():
+        raise HTTPException(status_code=400, detail="Question cannot be empty")
+    session = get_session(session_id)
+    llm = Settings.llm
+    if not isinstance(llm, InstrumentedOllama):
+        raise HTTPException(status_code=503, detail="Sessions need the Ollama LLM")
+
+    try:
+        # Turns of one session are serialized: each one continues from the context of the last
+        async with session.lock, admitted(request.priority):
+            nodes = await retrieve_nodes(request.question, filters=request.filters, mode=request.mode)
+            nodes = build_context(nodes, SESSION_CONTEXT_TOKEN_BUDGET)
+            prompt, reset = session_prompt(session, request.question, nodes, llm.context_window, llm.system_prompt)
+            with observe_stage("generation", upstream="ollama"):
+                response = await llm.async_client.generate(
+                    model=llm.model,
+                    prompt=prompt,
+                    system=llm.system_prompt,
+                    context=None if reset or session.context is None else session.context.tolist(),
+                    keep_alive=llm.keep_alive,
+                    options={"temperature": llm.temperature, "num_ctx": llm.context_window}
+                )
+            record_token_usage({"usage": {
+                "prompt_tokens": response.prompt_eval_count or 0, "completion_tokens": response.eval_count or 0
+            }})
+            session_store.record_turn(session, response.context, request.question, response.response)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing session turn: {str(e)}")
+
+    return SessionQueryResponse(
+        session_id=session_id,
+        turn=len(session.turns),
+        answer=response.response,
+        sources=format_sources(nodes),
+        prompt_tokens=response.prompt_eval_count or 0,
+        context_tokens=session.context_tokens
+    )
+
 @app.get("/")
 async def root():
     return {
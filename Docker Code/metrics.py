@@ -0,0 +1,248 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY, CollectorRegistry, generate_latest, multiprocess
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from llama_index.core.base.llms.types import ChatMessage, ChatResponse, ChatResponseAsyncGen
+from llama_index.llms.ollama.base import Ollama as OllamaLLM
+
+# Set (to an empty directory) when running several workers, so /metrics aggregates all of them
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+# Generation on a local 20B model can take minutes, so the buckets reach well past the usual web defaults
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+STAGE_SECONDS = Histogram(
+    "nalanda_stage_seconds",
+    "Time spent in each RAG pipeline stage",
+    ["stage"],
+    buckets=LATENCY_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    "nalanda_request_seconds",
+    "End-to-end request latency, including the whole body of streamed responses",
+    ["endpoint"],
+    buckets=LATENCY_BUCKETS
+)
+REQUESTS = Counter("nalanda_requests_total", "Requests by endpoint and HTTP status", ["endpoint", "status"])
+IN_FLIGHT = Gauge("nalanda_requests_in_flight", "Requests currently being served", ["endpoint"], multiprocess_mode="livesum")
+UPSTREAM_ERRORS = Counter("nalanda_upstream_errors_total", "Failed calls to Ollama or Chroma", ["upstream"])
+LLM_TOKENS = Counter("nalanda_llm_tokens_total", "Tokens reported by Ollama, prompt (in) and completion (out)", ["direction"])
+ADMISSION_ACTIVE = Gauge("nalanda_admission_active", "Requests holding a generation slot", multiprocess_mode="livesum")
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "nalanda_admission_queue_depth",
+    "Requests waiting for a generation slot",
+    ["priority"],
+    multiprocess_mode="livesum"
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+    "nalanda_admission_wait_seconds",
+    "Time admitted requests waited for a generation slot",
+    ["priority"],
+    buckets=LATENCY_BUCKETS
+)
+ADMISSION_REJECTED = Counter("nalanda_admission_rejected_total", "Requests turned away with 429", ["priority", "reason"])
+# Summed over workers, like the other live gauges
+HTTP_POOL_CONNECTIONS = Gauge(
+    "nalanda_http_pool_connections",
+    "Connections in the keep-alive pool to each upstream, by state (open, idle, in_use)",
+    ["upstream", "state"],
+    multiprocess_mode="livesum"
+)
+HTTP_POOL_MAX_CONNECTIONS = Gauge(
+    "nalanda_http_pool_max_connections",
+    "Connection limit of the pool to each upstream",
+    ["upstream"],
+    multiprocess_mode="livesum"
+)
+
+# Set while a response synthesizer runs, so the LLM can tell how long prompt assembly took
+synthesis_started: ContextVar[Optional[float]] = ContextVar("synthesis_started", default=None)
+
+
+@contextmanager
+def observe_stage(stage: str, upstream: Optional[str] = None):
+    """Time a pipeline stage; failures are also counted against the upstream it talks to."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        if upstream is not None:
+            UPSTREAM_ERRORS.labels(upstream=upstream).inc()
+        raise
+    finally:
+        STAGE_SECONDS.labels(stage=stage).observe(time.perf_counter() - started)
+
+
+@contextmanager
+def observe_synthesis():
+    """Time response synthesis; the first LLM call inside it also records the prompt_assembly stage."""
+    token = synthesis_started.set(time.perf_counter())
+    try:
+        with observe_stage("synthesis"):
+            yield
+    finally:
+        synthesis_started.reset(token)
+
+
+def record_prompt_assembled() -> None:
+    started = synthesis_started.get()
+    if started is not None:
+        STAGE_SECONDS.labels(stage="prompt_assembly").observe(time.perf_counter() - started)
+        synthesis_started.set(None)
+
+
+def record_token_usage(raw: Any) -> None:
+    """Count the prompt/completion tokens Ollama reports in a (final) chat response."""
+    try:
+        usage = raw["usage"]
+    except (KeyError, TypeError, AttributeError):
+        return
+    LLM_TOKENS.labels(direction="prompt").inc(usage.get("prompt_tokens", 0))
+    LLM_TOKENS.labels(direction="completion").inc(usage.get("completion_tokens", 0))
+
+
+class InstrumentedOllama(OllamaLLM):
+    """Ollama LLM that reports generation latency, time to first token and token counts."""
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "InstrumentedOllama"
+
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        record_prompt_assembled()
+        with observe_stage("generation", upstream="ollama"):
+            response = await super().achat(messages, **kwargs)
+        record_token_usage(response.raw)
+        return response
+
+    async def astream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseAsyncGen:
+        record_prompt_assembled()
+
+        async def gen() -> ChatResponseAsyncGen:
+            started = time.perf_counter()
+            last = None
+            with observe_stage("generation", upstream="ollama"):
+                async for chunk in await super(InstrumentedOllama, self).astream_chat(messages, **kwargs):
+                    if last is None:
+                        STAGE_SECONDS.labels(stage="first_token").observe(time.perf_counter() - started)
+                    last = chunk
+                    yield chunk
+            if last is not None:
+                record_token_usage(last.raw)
+
+        return gen()
+
+
+class CacheStatsCollector:
+    """
+    Exposes the hit/miss counters that the caches already keep (see their stats())
+    at scrape time instead of duplicating them in prometheus_client objects.
+    """
+
+    def __init__(self, sources: Dict[str, Callable[[], Optional[Dict[str, Any]]]]):
+        self.sources = sources
+
+    def collect(self) -> Iterable:
+        hits = CounterMetricFamily("nalanda_cache_hits", "Cache hits", labels=["cache"])
+        misses = CounterMetricFamily("nalanda_cache_misses", "Cache misses", labels=["cache"])
+        ratio = GaugeMetricFamily("nalanda_cache_hit_ratio", "Cache hits / lookups since start", labels=["cache"])
+        entries = GaugeMetricFamily("nalanda_cache_entries", "Entries held in memory", labels=["cache"])
+        for name, stats_fn in self.sources.items():
+            stats = stats_fn()
+            if stats is None:
+                continue
+            # The embedding cache splits hits into memory and disk hits
+            hit_count = stats["hits"] + stats.get("disk_hits", 0)
+            hits.add_metric([name], hit_count)
+            misses.add_metric([name], stats["misses"])
+            ratio.add_metric([name], stats["hit_ratio"])
+            entries.add_metric([name], stats["entries"])
+        return [hits, misses, ratio, entries]
+
+
+cache_collectors: List[CacheStatsCollector] = []
+
+
+def register_cache_stats(sources: Dict[str, Callable[[], Optional[Dict[str, Any]]]]) -> None:
+    collector = CacheStatsCollector(sources)
+    cache_collectors.append(collector)
+    if not MULTIPROCESS:
+        REGISTRY.register(collector)
+
+
+pool_sources: Dict[str, Callable[[], Optional[Dict[str, Any]]]] = {}
+
+
+def register_pool_stats(sources: Dict[str, Callable[[], Optional[Dict[str, Any]]]]) -> None:
+    """Connection pools (see http_pool.pool_stats) whose gauges are refreshed after every request and scrape."""
+    pool_sources.update(sources)
+
+
+def update_pool_gauges() -> None:
+    for upstream, stats_fn in pool_sources.items():
+        try:
+            stats = stats_fn()
+        except Exception:
+            continue
+        if stats is None:
+            continue
+        HTTP_POOL_MAX_CONNECTIONS.labels(upstream=upstream).set(stats["max_connections"])
+        for state in ("open", "idle", "in_use"):
+            HTTP_POOL_CONNECTIONS.labels(upstream=upstream, state=state).set(stats[f"{state}_connections"])
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware counting requests, in-flight requests and latency per endpoint.
+    Working at the ASGI level means a streamed response is timed until its last byte.
+    """
+
+    def __init__(self, app, paths: Iterable[str]):
+        self.app = app
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        endpoint = scope["path"]
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        IN_FLIGHT.labels(endpoint=endpoint).inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            IN_FLIGHT.labels(endpoint=endpoint).dec()
+            REQUEST_SECONDS.labels(endpoint=endpoint).observe(time.perf_counter() - started)
+            REQUESTS.labels(endpoint=endpoint, status=str(status["code"])).inc()
+            # Each worker refreshes its own pool gauges; a scrape only reaches one of them
+            update_pool_gauges()
+
+
+def render_metrics() -> bytes:
+    update_pool_gauges()
+    if not MULTIPROCESS:
+        return generate_latest(REGISTRY)
+    # Histograms, counters and gauges are summed over the files every worker writes;
+    # the cache collectors only know the caches of the worker answering this scrape
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    for collector in cache_collectors:
+        registry.register(collector)
+    return generate_latest(registry)
+
+
+def mark_worker_exited() -> None:
+    """Drop this worker's live gauges from the aggregate when it shuts down."""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,548 @@
+import os
+import json
+import shutil
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore, FilterCondition, FilterOperator, MetadataFilter, MetadataFilters,
+    VectorStoreQuery, VectorStoreQueryResult
+)
+from llama_index.core.vector_stores.utils import metadata_dict_to_node, node_to_metadata_dict
+from ivf import IVFIndex
+
+MANIFEST = "manifest.json"
+# Rows added since the last save(), with their vectors, until save() writes them into the new generation
+STAGING = "staging.sqlite"
+# Rows copied per step while save() writes a generation, so it never holds the whole matrix in memory
+COPY_BLOCK_ROWS = 16384
+# Rows scored per matrix product, so batched queries never materialize an N x B score matrix
+SEARCH_BLOCK_ROWS = 65536
+# Quantized codes are converted to float32 per block; a smaller block (12 MB at 768 dims) stays in cache
+QUANTIZED_BLOCK_ROWS = 4096
+# Representations the first search pass can scan; "none" scans the float32 vectors themselves
+QUANTIZATIONS = ("none", "float16", "int8")
+
+
+def quantize(embeddings: np.ndarray, quantization: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Compact copy of unit-normalized vectors for the first search pass: float16 halves the size,
+    int8 quarters it with one float32 scale per vector (symmetric, scale = max |x| / 127).
+    """
+    if quantization == "float16":
+        return embeddings.astype(np.float16), None
+    if quantization == "int8":
+        scales = np.abs(embeddings).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.round(embeddings / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    raise ValueError(f"Unknown quantization {quantization!r}; expected one of {', '.join(QUANTIZATIONS)}")
+
+
+def _save_array(path: Path, array: np.ndarray) -> None:
+    # Never rewrite a file in place: workers may have it memory-mapped
+    with open(path.with_name(path.name + ".tmp"), "wb") as f:
+        np.save(f, array)
+    os.replace(path.with_name(path.name + ".tmp"), path)
+
+
+class NumpyVectorStore(BasePydanticVectorStore):
+    """
+    Exact (brute-force) cosine search over a flat float32 matrix, as a drop-in
+    replacement for ChromaVectorStore on corpora that fit on one machine.
+
+    On disk (one directory):
+      - `embeddings-<generation>.npy`: unit-normalized vectors, memory-mapped read-only,
+        so every worker process shares one copy through the page cache
+      - `nodes-<generation>.sqlite`: the sidecar table (row, node_id, ref_doc_id, text, metadata)
+      - `codes-<generation>.npy` (+ `scales-<generation>.npy` for int8): the optional quantized
+        copy that searches scan first; only the top candidates are re-scored against the float32
+        vectors, so those stay on disk apart from the pages re-scoring touches
+      - `ivf-<generation>/`: the optional approximate (IVF, optionally PQ) index, see ivf.py
+      - `manifest.json`: which generation is current, plus count, dimension, quantization and index_version
+
+    Writers (ingest.py) stage additions in `staging.sqlite` (one writer at a time) and
+    deletions in memory, and `persist()` them as a new generation, copying block by block so
+    memory stays bounded however large the store is; the manifest is replaced last, so readers
+    switch over atomically and keep using the old files they have open until they reload.
+    """
+
+    stores_text: bool = True
+    flat_metadata: bool = False
+    path: str
+    # None keeps whatever the store on disk was saved with
+    quantization: Optional[str] = None
+    # Candidates re-scored exactly per requested result; 0 returns the quantized scores as they are
+    rescore_factor: int = 4
+    # IVF lists built at save() (0: exact search only) and PQ bytes per vector (0: score the vectors);
+    # None keeps what the store on disk was saved with
+    ivf_lists: Optional[int] = None
+    pq_subvectors: Optional[int] = None
+    # Lists searched per query; 0 ignores the IVF index and searches exhaustively
+    nprobe: int = 8
+
+    _manifest: Dict[str, Any] = PrivateAttr(default_factory=dict)
+    _embeddings: Optional[np.ndarray] = PrivateAttr(default=None)
+    _codes: Optional[np.ndarray] = PrivateAttr(default=None)
+    _scales: Optional[np.ndarray] = PrivateAttr(default=None)
+    _ivf: Optional[IVFIndex] = PrivateAttr(default=None)
+    _db: Optional[sqlite3.Connection] = PrivateAttr(default=None)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _columns: Dict[str, np.ndarray] = PrivateAttr(default_factory=dict)
+    _staging: Optional[sqlite3.Connection] = PrivateAttr(default=None)
+    _deleted_rows: set = PrivateAttr(default_factory=set)
+
+    def __init__(self, path: str, **kwargs: Any) -> None:
+        super().__init__(path=path, **kwargs)
+        manifest_path = Path(path) / MANIFEST
+        if manifest_path.exists():
+            with open(manifest_path, encoding="utf-8") as f:
+                self._manifest = json.load(f)
+            self._open()
+        if self.quantization is None:
+            self.quantization = self._manifest.get("quantization", "none")
+        if self.ivf_lists is None:
+            self.ivf_lists = self._manifest.get("ivf_lists", 0)
+        if self.pq_subvectors is None:
+            self.pq_subvectors = self._manifest.get("pq_subvectors", 0)
+        if self.quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization {self.quantization!r}; expected one of {', '.join(QUANTIZATIONS)}")
+
+    def _open(self) -> None:
+        """Map the files of the generation named in the manifest."""
+        directory = Path(self.path)
+        self._embeddings = np.load(directory / self._manifest["embeddings"], mmap_mode="r")
+        codes, scales = self._manifest.get("codes"), self._manifest.get("scales")
+        self._codes = np.load(directory / codes, mmap_mode="r") if codes else None
+        self._scales = np.load(directory / scales) if scales else None
+        self._ivf = IVFIndex.load(directory / self._manifest["ivf"]) if self._manifest.get("ivf") else None
+        self._db = sqlite3.connect(
+            f"file:{directory / self._manifest['nodes']}?mode=ro", uri=True, check_same_thread=False
+        )
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "NumpyVectorStore"
+
+    @staticmethod
+    def mtime(path: str) -> Optional[float]:
+        """Modification time of the manifest, or None if nothing has been persisted yet."""
+        try:
+            return os.stat(Path(path) / MANIFEST).st_mtime
+        except FileNotFoundError:
+            return None
+
+    @property
+    def client(self) -> "NumpyVectorStore":
+        return self
+
+    def memory_bytes(self) -> Dict[str, int]:
+        """
+        Size of what the first search pass reads (resident under load) and of the float32 vectors.
+        Searches through the IVF index also read the index; with IVF-PQ they read only the index.
+        """
+        scanned = self._embeddings if self._codes is None else self._codes
+        search = 0 if scanned is None else scanned.nbytes + (0 if self._scales is None else self._scales.nbytes)
+        if self._ivf is not None and self.nprobe > 0:
+            search = self._ivf.nbytes + (0 if self._ivf.codes is not None else search)
+        return {"search": search, "float32": 0 if self._embeddings is None else self._embeddings.nbytes}
+
+    @property
+    def index_version(self) -> Optional[str]:
+        return self._manifest.get("index_version")
+
+    @property
+    def count(self) -> int:
+        # Not __len__: an empty store would be falsy, and StorageContext.from_defaults would replace it
+        return 0 if self._embeddings is None else len(self._embeddings)
+
+    # Writing
+
+    def add(self, nodes: Sequence[BaseNode], **add_kwargs: Any) -> List[str]:
+        if not nodes:
+            return []
+        vectors = np.asarray([node.get_embedding() for node in nodes], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1.0, norms)
+        staging = self._staging_db()
+        staging.executemany("INSERT INTO pending (node_id, ref_doc_id, text, metadata, embedding) VALUES (?, ?, ?, ?, ?)", (
+            (node.node_id, node.ref_doc_id, node.get_content(),
+             json.dumps(node_to_metadata_dict(node, remove_text=True, flat_metadata=self.flat_metadata),
+                        ensure_ascii=False), vector.tobytes())
+            for node, vector in zip(nodes, vectors)
+        ))
+        staging.commit()
+        return [node.node_id for node in nodes]
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        """Stage removal of every chunk of a source document; applied by persist()."""
+        self._deleted_rows.update(self._rows_where("ref_doc_id", [ref_doc_id]))
+        self._delete_pending("ref_doc_id", [ref_doc_id])
+
+    def delete_nodes(self, node_ids: Optional[List[str]] = None,
+                     filters: Optional[MetadataFilters] = None, **delete_kwargs: Any) -> None:
+        """
+        Stage removal of the chunks with these ids, or matching these metadata filters, or
+        both (ids that also match); applied by persist(). Staged additions are removed now.
+        """
+        node_ids = list(set(node_ids or []))
+        if filters is None or not filters.filters:
+            self._deleted_rows.update(self._rows_where("node_id", node_ids))
+            self._delete_pending("node_id", node_ids)
+            return
+        if self.count:
+            self._deleted_rows.update(np.flatnonzero(self._query_mask(filters, node_ids)).tolist())
+        if self._staging is not None:
+            rows = self._staging.execute("SELECT seq, node_id FROM pending ORDER BY seq").fetchall()
+            pending_mask = self._filters_mask(filters, self._pending_column)
+            if node_ids:
+                wanted = set(node_ids)
+                pending_mask &= np.fromiter((node_id in wanted for _, node_id in rows), dtype=bool, count=len(rows))
+            self._delete_pending("seq", [seq for (seq, _), matched in zip(rows, pending_mask) if matched])
+
+    def clear(self) -> None:
+        """Stage removal of every row; applied by persist()."""
+        self._deleted_rows = set(range(self.count))
+        self._drop_staging()
+
+    @property
+    def pending_count(self) -> int:
+        """Rows added since the last save()."""
+        if self._staging is None:
+            return 0
+        return self._staging.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+
+    def persist(self, persist_path: Optional[str] = None, fs: Any = None) -> None:
+        self.save()
+
+    def save(self, index_version: Optional[str] = None) -> None:
+        """Write the current rows plus staged changes as a new generation and switch the manifest to it."""
+        directory = Path(self.path)
+        directory.mkdir(parents=True, exist_ok=True)
+        generation = self._manifest.get("generation", 0) + 1
+        embeddings_file = f"embeddings-{generation}.npy"
+        nodes_file = f"nodes-{generation}.sqlite"
+        codes_file = scales_file = None
+
+        kept = np.ones(self.count, dtype=bool)
+        kept[list(self._deleted_rows)] = False
+        n_kept, n_pending = int(kept.sum()), self.pending_count
+        # An emptied store still gets a generation: (0, dim) vectors, an empty sidecar, no IVF index
+        if self._embeddings is not None:
+            dim = self._embeddings.shape[1]
+        elif n_pending:
+            dim = len(self._staging.execute("SELECT embedding FROM pending LIMIT 1").fetchone()[0]) // 4
+        else:
+            dim = self._manifest.get("dim", 0)
+
+        # Kept rows of the current generation, then the staged ones, written block by block
+        embeddings = np.lib.format.open_memmap(directory / f"{embeddings_file}.tmp", mode="w+",
+                                               dtype=np.float32, shape=(n_kept + n_pending, dim))
+        written = 0
+        for start in range(0, self.count, COPY_BLOCK_ROWS):
+            block = np.asarray(self._embeddings[start:start + COPY_BLOCK_ROWS])[kept[start:start + COPY_BLOCK_ROWS]]
+            embeddings[written:written + len(block)] = block
+            written += len(block)
+        if n_pending:
+            cursor = self._staging.execute("SELECT embedding FROM pending ORDER BY seq")
+            while rows := cursor.fetchmany(COPY_BLOCK_ROWS):
+                embeddings[written:written + len(rows)] = np.frombuffer(b"".join(row for (row,) in rows),
+                                                                        dtype=np.float32).reshape(len(rows), dim)
+                written += len(rows)
+        embeddings.flush()
+        del embeddings
+        os.replace(directory / f"{embeddings_file}.tmp", directory / embeddings_file)
+        embeddings = np.load(directory / embeddings_file, mmap_mode="r")
+
+        if self.quantization != "none":
+            codes_file = f"codes-{generation}.npy"
+            codes = np.lib.format.open_memmap(directory / f"{codes_file}.tmp", mode="w+",
+                                              dtype=np.int8 if self.quantization == "int8" else np.float16,
+                                              shape=embeddings.shape)
+            scales = np.empty(len(embeddings), dtype=np.float32) if self.quantization == "int8" else None
+            for start in range(0, len(embeddings), COPY_BLOCK_ROWS):
+                block_codes, block_scales = quantize(np.asarray(embeddings[start:start + COPY_BLOCK_ROWS]), self.quantization)
+                codes[start:start + len(block_codes)] = block_codes
+                if scales is not None:
+                    scales[start:start + len(block_scales)] = block_scales
+            codes.flush()
+            del codes
+            os.replace(directory / f"{codes_file}.tmp", directory / codes_file)
+            if scales is not None:
+                scales_file = f"scales-{generation}.npy"
+                _save_array(directory / scales_file, scales)
+            del scales
+        ivf_dir = None
+        if self.ivf_lists and len(embeddings):
+            ivf_dir = f"ivf-{generation}"
+            IVFIndex.train(embeddings, self.ivf_lists, self.pq_subvectors).save(directory / ivf_dir)
+
+        db_path = directory / nodes_file
+        db_path.unlink(missing_ok=True)
+        db = sqlite3.connect(db_path)
+        db.execute("CREATE TABLE nodes (row INTEGER PRIMARY KEY, node_id TEXT, ref_doc_id TEXT, text TEXT, metadata TEXT)")
+        if self._db is not None:
+            with self._lock:
+                cursor = self._db.execute("SELECT node_id, ref_doc_id, text, metadata FROM nodes ORDER BY row")
+                old_rows = (row for i, row in enumerate(cursor) if kept[i])
+                db.executemany("INSERT INTO nodes VALUES (?, ?, ?, ?, ?)",
+                               ((new, *row) for new, row in enumerate(old_rows)))
+        if n_pending:
+            cursor = self._staging.execute("SELECT node_id, ref_doc_id, text, metadata FROM pending ORDER BY seq")
+            db.executemany("INSERT INTO nodes VALUES (?, ?, ?, ?, ?)",
+                           ((n_kept + i, *row) for i, row in enumerate(cursor)))
+        db.execute("CREATE INDEX nodes_node_id ON nodes (node_id)")
+        db.execute("CREATE INDEX nodes_ref_doc_id ON nodes (ref_doc_id)")
+        db.commit()
+        db.close()
+
+        previous = dict(self._manifest)
+        self._manifest = {
+            "generation": generation,
+            "embeddings": embeddings_file,
+            "nodes": nodes_file,
+            "codes": codes_file,
+            "scales": scales_file,
+            "quantization": self.quantization,
+            "ivf": ivf_dir,
+            "ivf_lists": self.ivf_lists,
+            "pq_subvectors": self.pq_subvectors,
+            "count": int(len(embeddings)),
+            "dim": int(embeddings.shape[1]),
+            "index_version": index_version or previous.get("index_version")
+        }
+        with open(directory / f"{MANIFEST}.tmp", "w", encoding="utf-8") as f:
+            json.dump(self._manifest, f, indent=2)
+        os.replace(directory / f"{MANIFEST}.tmp", directory / MANIFEST)
+
+        # Keep the previous generation for workers that read the old manifest a moment ago;
+        # anything older can go (open handles stay valid until they close them)
+        for prefix in ("embeddings", "codes", "scales"):
+            (directory / f"{prefix}-{generation - 2}.npy").unlink(missing_ok=True)
+        (directory / f"nodes-{generation - 2}.sqlite").unlink(missing_ok=True)
+        shutil.rmtree(directory / f"ivf-{generation - 2}", ignore_errors=True)
+        if self._db is not None:
+            self._db.close()
+        self._open()
+        self._columns.clear()
+        self._deleted_rows = set()
+        self._drop_staging()
+
+    # Reading
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.query_embedding is None:
+            raise ValueError("NumpyVectorStore needs a query embedding")
+        mask = self._query_mask(query.filters, query.node_ids, query.doc_ids)
+        return self.query_batch([query.query_embedding], query.similarity_top_k, mask=mask)[0]
+
+    def query_batch(self, query_embeddings: List[List[float]], top_k: int,
+                    filters: Optional[MetadataFilters] = None,
+                    mask: Optional[np.ndarray] = None) -> List[VectorStoreQueryResult]:
+        """Top-k for several queries with one blocked matrix product; filters become a shared boolean mask."""
+        if mask is None:
+            mask = self._query_mask(filters)
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1.0, norms)
+        rows, scores = self._search(queries, top_k, mask)
+        nodes = self._load_rows(sorted({int(r) for r in rows.ravel() if r >= 0}))
+        results = []
+        for query_rows, query_scores in zip(rows, scores):
+            hits = [(int(r), float(s)) for r, s in zip(query_rows, query_scores) if r >= 0]
+            results.append(VectorStoreQueryResult(
+                nodes=[nodes[r] for r, _ in hits],
+                similarities=[s for _, s in hits],
+                ids=[nodes[r].node_id for r, _ in hits]
+            ))
+        return results
+
+    def get_nodes(self, node_ids: Optional[List[str]] = None,
+                  filters: Optional[MetadataFilters] = None) -> List[BaseNode]:
+        mask = self._query_mask(filters, node_ids)
+        rows = np.flatnonzero(mask).tolist() if mask is not None else list(range(self.count))
+        nodes = self._load_rows(rows)
+        return [nodes[r] for r in rows]
+
+    def _search(self, queries: np.ndarray, top_k: int, mask: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (rows, scores), each (n_queries, top_k), best first; missing hits have row -1."""
+        matrix, scales = (self._embeddings, None) if self._codes is None else (self._codes, self._scales)
+        use_ivf = self._ivf is not None and self.nprobe > 0
+        approximate = self._codes is not None or (use_ivf and self._ivf.codes is not None)
+        rescore = approximate and self.rescore_factor > 0
+        depth = top_k * self.rescore_factor if rescore else top_k
+        if use_ivf:
+            rows, scores = self._ivf.search(queries, depth, self.nprobe, mask, matrix, scales)
+            # The probed lists may hold too few rows (e.g. under a selective filter): search those queries exhaustively
+            short = np.flatnonzero((rows[:, :top_k] < 0).any(axis=1))
+            if len(short):
+                rows[short], scores[short] = self._scan(matrix, scales, queries[short], depth, mask)
+        else:
+            rows, scores = self._scan(matrix, scales, queries, depth, mask)
+        return self._rescore(queries, rows, top_k) if rescore else (rows, scores)
+
+    def _rescore(self, queries: np.ndarray, candidates: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact float32 scores for each query's candidate rows, keeping the best top_k."""
+        best_rows = np.full((len(queries), top_k), -1, dtype=np.int64)
+        best_scores = np.full((len(queries), top_k), -np.inf, dtype=np.float32)
+        for i, (query, rows) in enumerate(zip(queries, candidates)):
+            rows = np.sort(rows[rows >= 0]) # Ascending rows read the memory map sequentially
+            scores = np.asarray(self._embeddings[rows]) @ query
+            order = np.argsort(-scores, kind="stable")[:top_k]
+            best_rows[i, :len(order)] = rows[order]
+            best_scores[i, :len(order)] = scores[order]
+        return best_rows, best_scores
+
+    def _scan(self, matrix: np.ndarray, scales: Optional[np.ndarray], queries: np.ndarray, top_k: int,
+              mask: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """Blocked top-k of queries @ matrix.T (times the per-row scales of int8 codes)."""
+        n_queries = len(queries)
+        best_rows = np.full((n_queries, 0), -1, dtype=np.int64)
+        best_scores = np.full((n_queries, 0), -np.inf, dtype=np.float32)
+        block_rows = SEARCH_BLOCK_ROWS if matrix.dtype == np.float32 else QUANTIZED_BLOCK_ROWS
+        for start in range(0, self.count, block_rows):
+            block = np.asarray(matrix[start:start + block_rows], dtype=np.float32)
+            scores = queries @ block.T
+            if scales is not None:
+                scores *= scales[start:start + len(block)]
+            if mask is not None:
+                scores[:, ~mask[start:start + len(block)]] = -np.inf
+            rows = np.broadcast_to(np.arange(start, start + len(block)), scores.shape)
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            best_rows = np.concatenate([best_rows, rows], axis=1)
+            if best_scores.shape[1] > top_k:
+                keep = np.argpartition(-best_scores, top_k - 1, axis=1)[:, :top_k]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_rows = np.where(np.isfinite(best_scores), np.take_along_axis(best_rows, order, axis=1), -1)
+        missing = top_k - best_rows.shape[1] # Fewer rows than top_k in the whole store
+        if missing > 0:
+            best_rows = np.pad(best_rows, ((0, 0), (0, missing)), constant_values=-1)
+            best_scores = np.pad(best_scores, ((0, 0), (0, missing)), constant_values=-np.inf)
+        return best_rows, best_scores
+
+    def _load_rows(self, rows: List[int]) -> Dict[int, BaseNode]:
+        if not rows:
+            return {}
+        nodes = {}
+        with self._lock:
+            for start in range(0, len(rows), 500):
+                chunk = rows[start:start + 500]
+                cursor = self._db.execute(
+                    f"SELECT row, text, metadata FROM nodes WHERE row IN ({','.join('?' * len(chunk))})", chunk
+                )
+                for row, text, metadata in cursor:
+                    nodes[row] = metadata_dict_to_node(json.loads(metadata), text=text)
+        return nodes
+
+    # Filtering
+
+    def _query_mask(self, filters: Optional[MetadataFilters] = None, node_ids: Optional[List[str]] = None,
+                    doc_ids: Optional[List[str]] = None) -> Optional[np.ndarray]:
+        mask = None
+        if filters is not None and filters.filters:
+            mask = self._filters_mask(filters)
+        for column, values in (("node_id", node_ids), ("ref_doc_id", doc_ids)):
+            if values:
+                selected = np.zeros(self.count, dtype=bool)
+                selected[self._rows_where(column, values)] = True
+                mask = selected if mask is None else mask & selected
+        return mask
+
+    def _filters_mask(self, filters: MetadataFilters,
+                      column: Optional[Callable[[str], np.ndarray]] = None) -> np.ndarray:
+        """Rows matching the filters; column reads one metadata key of every row (default: the stored rows)."""
+        column = column or self._column
+        masks = [
+            self._filters_mask(f, column) if isinstance(f, MetadataFilters) else self._filter_mask(f, column(f.key))
+            for f in filters.filters
+        ]
+        if filters.condition == FilterCondition.OR:
+            return np.logical_or.reduce(masks)
+        mask = np.logical_and.reduce(masks)
+        return ~mask if filters.condition == FilterCondition.NOT else mask
+
+    def _filter_mask(self, metadata_filter: MetadataFilter, column: np.ndarray) -> np.ndarray:
+        value = metadata_filter.value
+        operator = metadata_filter.operator
+        if operator == FilterOperator.EQ:
+            return column == value
+        if operator == FilterOperator.NE:
+            return column != value
+        if operator in (FilterOperator.IN, FilterOperator.NIN):
+            values = set(value)
+            inside = np.fromiter((v in values for v in column), dtype=bool, count=len(column))
+            return inside if operator == FilterOperator.IN else ~inside
+        if operator in (FilterOperator.GT, FilterOperator.GTE, FilterOperator.LT, FilterOperator.LTE):
+            numbers = np.asarray([v if isinstance(v, (int, float)) else np.nan for v in column], dtype=np.float64)
+            with np.errstate(invalid="ignore"):
+                return {
+                    FilterOperator.GT: numbers > value,
+                    FilterOperator.GTE: numbers >= value,
+                    FilterOperator.LT: numbers < value,
+                    FilterOperator.LTE: numbers <= value
+                }[operator]
+        raise ValueError(f"NumpyVectorStore does not support the {operator} filter operator")
+
+    def _column(self, key: str) -> np.ndarray:
+        """All values of one metadata key in row order, loaded once per key (and per generation)."""
+        column = self._columns.get(key)
+        if column is None:
+            with self._lock:
+                cursor = self._db.execute("SELECT json_extract(metadata, ?) FROM nodes ORDER BY row", (f'$."{key}"',))
+                column = np.asarray([value for (value,) in cursor] + [None], dtype=object)[:-1]
+            self._columns[key] = column
+        return column
+
+    def _pending_column(self, key: str) -> np.ndarray:
+        """Like _column, for the rows staged since the last save() (in seq order)."""
+        cursor = self._staging.execute("SELECT json_extract(metadata, ?) FROM pending ORDER BY seq", (f'$."{key}"',))
+        return np.asarray([value for (value,) in cursor] + [None], dtype=object)[:-1]
+
+    def _rows_where(self, column: str, values: List[str]) -> List[int]:
+        if self._db is None or not values:
+            return []
+        rows = []
+        with self._lock:
+            for start in range(0, len(values), 500):
+                chunk = values[start:start + 500]
+                cursor = self._db.execute(
+                    f"SELECT row FROM nodes WHERE {column} IN ({','.join('?' * len(chunk))})", chunk
+                )
+                rows.extend(row for (row,) in cursor)
+        return rows
+
+    def _staging_db(self) -> sqlite3.Connection:
+        if self._staging is None:
+            path = Path(self.path) / STAGING
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Left over from a writer that stopped before save(); its rows were never persisted
+            path.unlink(missing_ok=True)
+            self._staging = sqlite3.connect(path, check_same_thread=False)
+            self._staging.execute("PRAGMA journal_mode = OFF")
+            self._staging.execute("PRAGMA synchronous = OFF")
+            self._staging.execute("CREATE TABLE pending (seq INTEGER PRIMARY KEY, node_id TEXT, ref_doc_id TEXT, "
+                                  "text TEXT, metadata TEXT, embedding BLOB)")
+            self._staging.execute("CREATE INDEX pending_node_id ON pending (node_id)")
+            self._staging.execute("CREATE INDEX pending_ref_doc_id ON pending (ref_doc_id)")
+        return self._staging
+
+    def _delete_pending(self, column: str, values: List[str]) -> None:
+        if self._staging is None or not values:
+            return
+        for start in range(0, len(values), 500):
+            chunk = values[start:start + 500]
+            self._staging.execute(f"DELETE FROM pending WHERE {column} IN ({','.join('?' * len(chunk))})", chunk)
+        self._staging.commit()
+
+    def _drop_staging(self) -> None:
+        if self._staging is not None:
+            self._staging.close()
+            self._staging = None
+            (Path(self.path) / STAGING).unlink(missing_ok=True)
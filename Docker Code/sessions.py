@@ -0,0 +1,131 @@
+import sys
+import time
+import uuid
+import asyncio
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+# Characters of each earlier answer kept for the recap that replaces an overfull context
+RECAP_ANSWER_CHARS = 300
+
+
+@dataclass
+class Session:
+    session_id: str
+    # Ollama's context tokens after the last turn; sending them back means only the new turn is prefilled
+    context: Optional[np.ndarray] = None
+    # (question, truncated answer) per turn, only used to write a recap when the context is reset
+    turns: List[Tuple[str, str]] = field(default_factory=list)
+    created_at: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+    # Turns of one session run one at a time, each continuing from the previous context
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    @property
+    def context_tokens(self) -> int:
+        return 0 if self.context is None else len(self.context)
+
+    @property
+    def size_bytes(self) -> int:
+        return (0 if self.context is None else self.context.nbytes) + sum(
+            sys.getsizeof(question) + sys.getsizeof(answer) for question, answer in self.turns
+        ) + 256
+
+    def recap(self, turns: int) -> str:
+        """The last few turns as plain text, to carry the conversation into a fresh context."""
+        lines = []
+        for question, answer in self.turns[-turns:]:
+            lines.append(f"Q: {question}\nA: {answer}")
+        return "\n".join(lines)
+
+
+class SessionStore:
+    """
+    In-memory conversation sessions, least recently used first out when max_sessions or
+    max_bytes is exceeded, and dropped after idle_seconds without a turn. Sessions live in
+    the worker that created them.
+    """
+
+    def __init__(self, max_sessions: int = 1000, max_bytes: int = 64 * 1024 * 1024, idle_seconds: float = 1800.0):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self.created = 0
+        self.evictions = 0
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def create(self) -> Session:
+        with self._lock:
+            self._evict_idle()
+            session = Session(session_id=uuid.uuid4().hex)
+            self._sessions[session.session_id] = session
+            self._resize(session)
+            self.created += 1
+            return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        with self._lock:
+            self._evict_idle()
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_used = time.monotonic()
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def record_turn(self, session: Session, context: Optional[Sequence[int]], question: str, answer: str) -> None:
+        """Keep the context Ollama returned and a short note of the turn."""
+        with self._lock:
+            session.context = np.asarray(context, dtype=np.int32) if context else None
+            session.turns.append((question, answer[:RECAP_ANSWER_CHARS]))
+            session.last_used = time.monotonic()
+            if session.session_id in self._sessions:
+                self._sessions.move_to_end(session.session_id)
+                self._resize(session)
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            if session_id not in self._sessions:
+                return False
+            self._remove(session_id)
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "bytes": self._total_bytes,
+                "created": self.created,
+                "evictions": self.evictions
+            }
+
+    def _resize(self, session: Session) -> None:
+        size = session.size_bytes
+        self._total_bytes += size - self._sizes.get(session.session_id, 0)
+        self._sizes[session.session_id] = size
+        # Never evict the session that is being written
+        while len(self._sessions) > 1 and (len(self._sessions) > self.max_sessions or self._total_bytes > self.max_bytes):
+            oldest = next(iter(self._sessions))
+            if oldest == session.session_id:
+                break
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _evict_idle(self) -> None:
+        now = time.monotonic()
+        # Ordered by last use, so the idle ones are at the front
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_used <= self.idle_seconds:
+                break
+            self._remove(oldest.session_id)
+            self.evictions += 1
+
+    def _remove(self, session_id: str) -> None:
+        self._sessions.pop(session_id)
+        self._total_bytes -= self._sizes.pop(session_id, 0)
@@ -0,0 +1,100 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Tuple, AsyncIterator
+
+
+class Broadcast:
+    """
+    Append-only event log that any number of subscribers can read from the
+    beginning while it is still being written, so late joiners replay what
+    they missed and then follow live.
+    """
+
+    def __init__(self):
+        self._events: List[Tuple[str, Dict[str, Any]]] = []
+        self._closed = False
+        self._changed = asyncio.Event()
+
+    def publish(self, event: str, data: Dict[str, Any]) -> None:
+        self._events.append((event, data))
+        self._wake()
+
+    def close(self) -> None:
+        self._closed = True
+        self._wake()
+
+    async def subscribe(self) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        position = 0
+        while True:
+            if position < len(self._events):
+                yield self._events[position]
+                position += 1
+            elif self._closed:
+                return
+            else:
+                await self._changed.wait()
+
+    def _wake(self) -> None:
+        # Each waiter holds its own Event.wait() future, so a disconnecting subscriber never affects the others
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent requests for the same key onto one in-flight computation.
+    The computation runs as its own task, so it finishes (and fills caches) even if
+    the client that started it disconnects.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._streams: Dict[str, Broadcast] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Await the result for key, starting factory() only if nobody else is computing it."""
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._forget(self._tasks, key, done))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stream(self, key: str, producer: Callable[[Broadcast], Awaitable[None]]) -> Broadcast:
+        """
+        Return the in-flight Broadcast for key, or start producer(broadcast) to fill a new one.
+        The producer should publish its own error events; the broadcast is closed when it returns.
+        """
+        broadcast = self._streams.get(key)
+        if broadcast is not None:
+            self.coalesced += 1
+            return broadcast
+        broadcast = Broadcast()
+        self._streams[key] = broadcast
+        self.started += 1
+
+        async def produce():
+            try:
+                await producer(broadcast)
+            finally:
+                broadcast.close()
+
+        task = asyncio.ensure_future(produce())
+        task.add_done_callback(lambda done: self._forget(self._streams, key, broadcast))
+        return broadcast
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._tasks) + len(self._streams),
+            "started": self.started,
+            "coalesced": self.coalesced
+        }
+
+    @staticmethod
+    def _forget(registry: Dict[str, Any], key: str, value: Any) -> None:
+        if registry.get(key) is value:
+            del registry[key]
@@ -0,0 +1,73 @@
+import sys
+import math
+import time
+import shutil
+import tempfile
+import argparse
+import numpy as np
+from llama_index.core.schema import TextNode
+from numpy_store import NumpyVectorStore
+from evaluate_quantization import NUMPY_STORE_PATH, load_corpus, make_queries, evaluate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall/latency sweep of the IVF (and IVF-PQ) index over nprobe")
+    parser.add_argument("--store", default=None, help=f"Store to take the vectors from (default: {NUMPY_STORE_PATH})")
+    parser.add_argument("--synthetic", action="store_true", help="Use the synthetic corpus even if a store exists")
+    parser.add_argument("--vectors", type=int, default=20000, help="Size of the synthetic corpus")
+    parser.add_argument("--queries", type=int, default=200, help="Evaluation queries")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--lists", type=int, default=0, help="IVF lists (default: 4 x sqrt(vectors))")
+    parser.add_argument("--pq", default="0,96", help="Comma-separated PQ subvectors to try; 0 means no PQ")
+    parser.add_argument("--quantization", default="none", help="Compact copy scored by IVF without PQ: none, float16, int8")
+    parser.add_argument("--nprobe", default="1,2,4,8,16,32,64", help="Comma-separated nprobe values")
+    parser.add_argument("--rescore-factor", type=int, default=4, help="Candidates re-scored per result for approximate scores")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Digital Nalanda - ANN Index Recall/Latency Sweep")
+    print("=" * 60)
+
+    corpus = load_corpus(args)
+    queries = make_queries(corpus, min(args.queries, len(corpus)))
+    truth = np.argsort(-(queries @ corpus.T), axis=1)[:, :args.top_k]
+    nodes = [TextNode(text="", id_=str(i), embedding=vector.tolist()) for i, vector in enumerate(corpus)]
+    lists = args.lists or max(1, int(4 * math.sqrt(len(corpus))))
+
+    results = []
+    for pq in [int(p) for p in args.pq.split(",") if p.strip()]:
+        path = tempfile.mkdtemp(prefix="ann-sweep-")
+        try:
+            store = NumpyVectorStore(path, quantization=args.quantization, ivf_lists=lists, pq_subvectors=pq,
+                                     rescore_factor=args.rescore_factor)
+            store.add(nodes)
+            print(f"\nBuilding IVF{lists}{f'-PQ{pq}' if pq else ''}...")
+            started = time.perf_counter()
+            store.save()
+            print(f"Built in {time.perf_counter() - started:.1f}s")
+            # nprobe 0 is the exhaustive baseline over the same store
+            for nprobe in [0] + [int(n) for n in args.nprobe.split(",") if n.strip()]:
+                if nprobe > lists:
+                    continue
+                store.nprobe = nprobe
+                results.append({"index": f"IVF{lists}{f'-PQ{pq}' if pq else ''}", "nprobe": nprobe,
+                                **evaluate(store, queries, truth, args.top_k)})
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+    if not results:
+        print("Nothing was evaluated.")
+        sys.exit(1)
+
+    print("\n" + "=" * 60)
+    print(f"{len(corpus)} vectors x {corpus.shape[1]} dims, {len(queries)} queries, top-{args.top_k}")
+    print(f"{'index':<16}{'nprobe':>8}{f'recall@{args.top_k}':>11}{'p50 ms':>9}{'search MB':>11}")
+    for result in results:
+        nprobe = result["nprobe"] or "exact"
+        print(f"{result['index']:<16}{nprobe:>8}{result['recall']:>11.3f}{result['query_p50_ms']:>9.2f}"
+              f"{result['search_mb']:>11.1f}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import re
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+from llama_index.core.readers.base import BaseReader
+from llama_index.core.schema import Document
+
+XML_LANG = "{http://www.w3.org/XML/1998/namespace}lang"
+# div, div1..div7, and the parts of <text> that hold them
+SECTION_TAG = re.compile(r"div\d?|front|body|back")
+# The units a section is made of; an element inside another one is part of the outer one's text
+BLOCK_TAGS = {"p", "ab", "lg", "l", "head", "trailer", "label", "item", "quote", "opener", "closer"}
+# Editorial apparatus and rejected readings: not part of the treatise
+SKIPPED_TAGS = {"note", "rdg", "sic", "del", "surplus", "fw", "teiHeader"}
+# Kept inline but followed by a space, so "SK 1" does not run into the sūtra
+SPACED_TAGS = {"label", "caesura"}
+# Breaks that may fall inside a word (break="no")
+BREAK_TAGS = {"lb", "pb", "cb"}
+# The SentenceSplitter's paragraph separator, so chunks prefer to end between verses and paragraphs
+BLOCK_SEPARATOR = "\n\n\n"
+# Long <head>s are shortened in the section path; the splitter refuses metadata longer than a chunk
+SECTION_MAX_CHARS = 200
+# Chunk metadata this reader adds; the LLM sees it, the embedder does not
+TEI_METADATA_KEYS = ["title", "author", "section"]
+SCRIPTS = {"Deva": "Devanagari", "Latn": "Latin"}
+# Dandas and the like around a heading, which would read as separators in the section path
+HEADING_PUNCTUATION = " /|।॥\u200c"
+
+_JOIN = "\x00" # break="no": the words on either side are one
+_LINE = "\x01" # a verse line ends
+
+
+def _local(tag: Any) -> str:
+    """Tag name without its namespace ('' for comments and processing instructions)."""
+    return tag.rsplit("}", 1)[-1] if isinstance(tag, str) else ""
+
+
+def _collect(element: ET.Element, parts: List[str]) -> None:
+    tag = element.tag
+    if tag in SKIPPED_TAGS:
+        return
+    if tag == "l" and parts:
+        parts.append(_LINE)
+    elif tag in BREAK_TAGS:
+        parts.append(_JOIN if element.get("break") == "no" else " ")
+    if element.text:
+        parts.append(element.text)
+    for child in element:
+        _collect(child, parts)
+        if child.tail:
+            parts.append(child.tail)
+    if tag in SPACED_TAGS:
+        parts.append(" ")
+
+
+def block_text(element: ET.Element) -> str:
+    """Whitespace-normalized text of a block; the lines of a verse (<lg>) stay on separate lines."""
+    parts: List[str] = []
+    _collect(element, parts)
+    text = re.sub(r"\s*\x00\s*", "", "".join(parts))
+    lines = (" ".join(line.split()) for line in text.split(_LINE))
+    return "\n".join(line for line in lines if line)
+
+
+def _normalized(element: ET.Element) -> str:
+    return " ".join("".join(element.itertext()).split())
+
+
+class TEIReader(BaseReader):
+    """
+    Reads a TEI XML document (the SARIT treatises) with iterparse, dropping each element once
+    it is read, so memory holds the current section rather than the whole tree. The teiHeader
+    only supplies the title and authors. Each <div> becomes its own Document (text ahead of a
+    nested div becomes one too), its paragraphs, sūtras and verses kept apart so the splitter
+    cuts between them where it can; "section" is the path of div headings leading to it.
+
+    Skipped apparatus inside a block drops out, the text after it stays:
+
+    >>> from io import BytesIO
+    >>> tei = b"<TEI><text><body><p>text A<note>a footnote</note> text B after the note.</p></body></text></TEI>"
+    >>> [doc.text for doc in TEIReader().lazy_load_data(BytesIO(tei))]
+    ['text A text B after the note.']
+    """
+
+    def lazy_load_data(self, file: Path, extra_info: Optional[Dict[str, Any]] = None) -> Iterator[Document]:
+        metadata = dict(extra_info or {})
+        title, author = "", ""
+        stack: List[ET.Element] = []
+        # Per open section: its n/type attributes, and its first <head> once read
+        labels: List[str] = []
+        headings: List[Optional[str]] = []
+        blocks: List[str] = []
+        # False while the pending blocks are only headings
+        has_body = False
+        skip_depth = block_depth = 0
+
+        def document(nested: bool = False) -> Optional[Document]:
+            nonlocal has_body
+            # A heading followed straight by sub-sections is already in their section path
+            text = BLOCK_SEPARATOR.join(blocks) if has_body or not nested else ""
+            blocks.clear()
+            has_body = False
+            if not text:
+                return None
+            section = " / ".join(filter(None, (heading or label for heading, label in zip(headings, labels))))
+            return Document(
+                text=text,
+                metadata={**metadata, "title": title, "author": author, "section": section},
+                excluded_embed_metadata_keys=list(TEI_METADATA_KEYS)
+            )
+
+        source = file if hasattr(file, "read") else str(file)
+        for event, element in ET.iterparse(source, events=("start", "end")):
+            if event == "start":
+                element.tag = tag = _local(element.tag)
+                stack.append(element)
+                if skip_depth or tag in SKIPPED_TAGS:
+                    skip_depth += 1
+                elif block_depth:
+                    block_depth += tag in BLOCK_TAGS
+                elif tag in BLOCK_TAGS:
+                    block_depth = 1
+                elif tag == "text" and element.get(XML_LANG, "").rsplit("-", 1)[-1] in SCRIPTS:
+                    metadata["lipi"] = SCRIPTS[element.get(XML_LANG).rsplit("-", 1)[-1]]
+                elif SECTION_TAG.fullmatch(tag):
+                    # What the enclosing section held before this one is a document of its own
+                    doc = document(nested=True)
+                    if doc is not None:
+                        yield doc
+                    labels.append(" ".join(filter(None, (element.get("type"), element.get("n")))).replace("_", " "))
+                    headings.append(None)
+                continue
+
+            stack.pop()
+            tag = element.tag
+            if skip_depth:
+                skip_depth -= 1
+                if skip_depth:
+                    continue
+                if tag == "teiHeader":
+                    title_stmt = element.find("fileDesc/titleStmt")
+                    if title_stmt is not None:
+                        titles = title_stmt.findall("title")
+                        main = [t for t in titles if t.get("type") == "main"] or \
+                            [t for t in titles if t.get("type") != "sub"] or titles
+                        title = _normalized(main[0]) if main else ""
+                        author = "; ".join(filter(None, (_normalized(a) for a in title_stmt.findall("author"))))
+                elif block_depth:
+                    # Its tail is block text: keep the emptied element, which _collect skips but whose tail it reads
+                    tail = element.tail
+                    element.clear()
+                    element.tail = tail
+                    continue
+            elif block_depth:
+                if tag not in BLOCK_TAGS:
+                    continue
+                block_depth -= 1
+                if block_depth:
+                    continue
+                text = block_text(element)
+                if text:
+                    blocks.append(text)
+                    has_body = has_body or tag != "head"
+                    if tag == "head" and headings and headings[-1] is None and SECTION_TAG.fullmatch(stack[-1].tag):
+                        headings[-1] = text.replace("\n", " ").strip(HEADING_PUNCTUATION)[:SECTION_MAX_CHARS]
+            elif SECTION_TAG.fullmatch(tag):
+                doc = document()
+                if doc is not None:
+                    yield doc
+                labels.pop()
+                headings.pop()
+            # Done with it: drop it from the tree, so memory is bounded by the block being read
+            element.clear()
+            if stack:
+                stack[-1].remove(element)
+        doc = document()
+        if doc is not None:
+            yield doc